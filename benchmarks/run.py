@@ -0,0 +1,264 @@
+"""
+Benchmarks of event dispatch, run cycle, scenario class creation and search of planned runs.
+Scenarios run on deterministic in-memory fakes, so results depend on library code only.
+
+    python benchmarks/run.py [-k dispatch,run] [--sizes 1000,10000000] [--compare HEAD~1]
+
+Results (ns per operation) are saved to .benchmarks/<commit>.json, run of same benchmarks on other commit
+may be compared with them
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ltsched.memory import MemoryScenarioStoreRepo  # noqa: E402
+from ltsched.model import BaseScenarioStore, ScenarioExecutionStatus, ScenarioId  # noqa: E402
+from ltsched.scenario import HandlerResult, RunContext, Scenario, event_handler, on_enter  # noqa: E402
+from ltsched.sqlite import SqliteScenarioStoreRepo  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, '.benchmarks')
+EPOCH = datetime(2020, 1, 1)
+Result = Tuple[str, float]  # (benchmark name, ns per operation)
+
+
+class FakeScheduler:
+
+    def __init__(self):
+        self.count = 0
+
+    async def schedule(self, point, task_name, *args, task_id=None, force=False) -> None:
+        self.count += 1
+
+
+class FakeStoreRepo:
+    """
+    Dict of stores without copies, so repo cost is not measured
+    """
+
+    def __init__(self):
+        self.stores: Dict[ScenarioId, BaseScenarioStore] = {}
+
+    async def read_store(self, identity: ScenarioId) -> Optional[BaseScenarioStore]:
+        return self.stores.get(identity)
+
+    async def write_store(self, identity: ScenarioId, store: BaseScenarioStore) -> None:
+        self.stores[identity] = store
+
+    async def search_planned(self, before: datetime) -> List[ScenarioId]:
+        return []
+
+
+def best_of(repeat: int, number: int, func: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e9
+
+
+async def best_of_async(repeat: int, number: int, func: Callable) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e9
+
+
+def make_scenario(states: int, events: int, wildcard: str) -> type:
+    """
+    Scenario class with handler of every event in every state (wildcard none),
+    one handler of every event in any state (wildcard state) or one handler of any event in every state
+    """
+    namespace = {'start_state': 's0', 'end_states': frozenset()}
+    state_names = [f's{it}' for it in range(states)]
+    event_names = [f'e{it}' for it in range(events)]
+
+    def make_handler():
+        # own function for every pair, event_handler keeps descriptor in function attribute
+        def handler(self, _):
+            return HandlerResult(state=self.store.state)
+        return handler
+
+    if wildcard == 'state':
+        pairs = [('*', it) for it in event_names]
+    elif wildcard == 'event':
+        pairs = [(it, '*') for it in state_names]
+    else:
+        pairs = [(s, e) for s in state_names for e in event_names]
+    for i, (state, event) in enumerate(pairs):
+        namespace[f'on_{i}'] = event_handler(event, [(state, '*')])(make_handler())
+    return type(f'Dispatch{states}x{events}{wildcard.title()}', (Scenario,), namespace)
+
+
+async def bench_dispatch(args) -> AsyncIterator[Result]:
+    for size in (4, 32, 256):
+        for wildcard in ('none', 'state', 'event'):
+            scenario = make_scenario(size, size, wildcard)(FakeScheduler(), FakeStoreRepo())
+            rnd = random.Random(size)
+            lookups = [(BaseScenarioStore(state=f's{rnd.randrange(size + 1)}'), f'e{rnd.randrange(size + 1)}')
+                       for _ in range(1024)]
+            context = RunContext('ID')
+
+            def dispatch():
+                for context.store, event in lookups:
+                    scenario.get_event_handler(event)
+
+            with scenario.use_context(context):
+                value = best_of(args.repeat, 10, dispatch) / len(lookups)
+            yield f'dispatch[{size}x{size}-{wildcard}]', value
+
+
+class PingPong(Scenario):
+    name = 'bench-ping-pong'
+    start_state = 'ping'
+    end_states = frozenset(('done',))
+
+    @event_handler('hit', [('ping', 'pong'), ('pong', 'ping')])
+    def on_hit(self, _):
+        return HandlerResult(state='pong' if self.store.state == 'ping' else 'ping')
+
+
+class AsyncPingPong(PingPong):
+
+    @event_handler('hit', [('ping', 'pong'), ('pong', 'ping')])
+    async def on_hit(self, _):
+        return HandlerResult(state='pong' if self.store.state == 'ping' else 'ping')
+
+
+class PlannedPingPong(PingPong):
+
+    @event_handler('hit', [('ping', 'pong'), ('pong', 'ping')])
+    def on_hit(self, _):
+        return HandlerResult(state='pong' if self.store.state == 'ping' else 'ping', next_event='hit',
+                             next_run=timedelta(seconds=1))
+
+    @on_enter(['ping', 'pong'])
+    def on_swap(self):
+        pass
+
+
+async def bench_run(args) -> AsyncIterator[Result]:
+    for name, scenario_class in (('sync', PingPong), ('async', AsyncPingPong), ('scheduled', PlannedPingPong)):
+        for repo_name, repo in (('fake', FakeStoreRepo()), ('memory', MemoryScenarioStoreRepo())):
+            scenario = scenario_class(FakeScheduler(), repo, clock=lambda: EPOCH)
+            identities = [f'ID-{it}' for it in range(100)]
+            for identity in identities:
+                await repo.write_store(identity, BaseScenarioStore(state='ping'))
+
+            async def run():
+                for identity in identities:
+                    await scenario.run(identity, 'hit')
+
+            yield f'run[{name}-{repo_name}]', await best_of_async(args.repeat, 20, run) / len(identities)
+
+
+async def bench_class_creation(args) -> AsyncIterator[Result]:
+    for depth in (1, 8, 32):
+        def create():
+            base = Scenario
+            for level in range(depth):
+                namespace = {f'on_{level}_{it}': event_handler(f'e{it}', [(f's{level}', f's{level + 1}')])(
+                    lambda self, _: None) for it in range(8)}
+                base = type(f'Level{level}', (base,), namespace)
+
+        yield f'class_creation[depth-{depth}]', best_of(args.repeat, 5, create) / depth
+
+
+async def fill_planned(repo, size: int) -> None:
+    rnd = random.Random(size)
+    runs = list(range(size))
+    rnd.shuffle(runs)
+    chunk = 10000
+    for start in range(0, size, chunk):
+        await repo.write_stores({f'ID-{i}': BaseScenarioStore(state='wait', exec_state=ScenarioExecutionStatus.Run,
+                                                               next_run=EPOCH + timedelta(seconds=runs[i]))
+                                 for i in range(start, min(start + chunk, size))})
+
+
+async def bench_search_planned(args) -> AsyncIterator[Result]:
+    # planned runs are one second apart, so search finds first 1000 of them
+    before = EPOCH + timedelta(seconds=1000)
+    for size in args.sizes:
+        for backend in args.backends:
+            with tempfile.TemporaryDirectory() as path:
+                repo = MemoryScenarioStoreRepo() if backend == 'memory' \
+                    else SqliteScenarioStoreRepo(os.path.join(path, 'bench.db'))
+                await fill_planned(repo, size)
+
+                async def search():
+                    await repo.search_planned(before)
+
+                yield f'search_planned[{backend}-{size}]', await best_of_async(args.repeat, 1, search)
+                close = getattr(repo, 'close', None)
+                if close:
+                    await close()
+
+
+BENCHMARKS = {'dispatch': bench_dispatch, 'run': bench_run, 'class_creation': bench_class_creation,
+              'search_planned': bench_search_planned}
+
+
+async def collect(args) -> Dict[str, float]:
+    results = {}
+
+    for group in args.groups:
+        async for name, value in BENCHMARKS[group](args):
+            results[name] = value
+            baseline = args.baseline.get(name)
+            change = f'{(value / baseline - 1) * 100:+8.1f}%' if baseline else ''
+            print(f'{name:48} {value:14.0f} ns {change}', flush=True)
+    return results
+
+
+def git_commit(ref: str = 'HEAD') -> str:
+    return subprocess.run(['git', 'rev-parse', '--short', ref], capture_output=True, text=True, check=True,
+                          cwd=ROOT).stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='groups', default=','.join(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='store counts of search_planned, up to 10000000')
+    parser.add_argument('--backends', default='memory,sqlite', help='store repos of search_planned')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--compare', help='commit or results file to compare with')
+    parser.add_argument('--output', help='results file, .benchmarks/<commit>.json by default')
+    args = parser.parse_args()
+    args.groups = args.groups.split(',')
+    args.sizes = [int(it) for it in args.sizes.split(',')]
+    args.backends = args.backends.split(',')
+    args.baseline = {}
+    if args.compare:
+        path = args.compare if os.path.exists(args.compare) \
+            else os.path.join(RESULTS_DIR, f'{git_commit(args.compare)}.json')
+        with open(path) as f:
+            args.baseline = json.load(f)['results']
+
+    # commit is looked up before run, so failed lookup does not lose results
+    commit = None if args.output else git_commit()
+    results = asyncio.run(collect(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from enum import Enum
+from typing import Callable, Deque, Dict, Iterable, Mapping, Optional, Tuple
+
+from .dispatcher import PLANNED, MailboxDispatcher
+from .model import ScenarioEvent, ScenarioId, ScenarioTaskName
+from .scenario import Scenario
+
+logger = logging.getLogger(__name__)
+
+
+class EventSource(Enum):
+    External = 'external'  # user actions etc.
+    Scheduled = 'scheduled'  # next runs from task scheduler or planned in store
+
+
+DefaultSourceWeights = {EventSource.External: 8, EventSource.Scheduled: 1}
+QueueKey = Tuple[EventSource, str]  # (source, scenario name)
+Admission = Tuple[ScenarioId, ScenarioEvent, asyncio.Future, float]  # (scenario id, event, result, enqueue time)
+
+
+class TokenBucket:
+    """
+    Rate limit of rate operations per second with bursts up to burst operations
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'clock')
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self) -> float:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def take(self) -> bool:
+        if self.refill() < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self) -> float:
+        return max(1 - self.refill(), 0) / self.rate
+
+
+class AdmissionController:
+    """
+    Front end of mailbox dispatchers, which keep latency of external events bounded while backlog of scheduled
+    runs is caught up. Events are queued by source and scenario name, workers take them from queues
+    by smooth weighted round robin, where weight of queue is product of source and scenario weights.
+    Queue of scenario is skipped while its token bucket is empty. Scheduled events beyond shed_threshold queued,
+    or waiting longer than max_delay, are not run but scheduled again after defer_delay through scenario scheduler.
+    Runs planned in store are never shed, as they have no task to reschedule
+    """
+
+    def __init__(self, scenarios: Iterable[Scenario], concurrency: int = 100,
+                 source_weights: Optional[Mapping[EventSource, int]] = None,
+                 scenario_weights: Optional[Mapping[str, int]] = None,
+                 rate_limits: Optional[Mapping[str, Tuple[float, int]]] = None,
+                 shed_threshold: Optional[int] = 10000, max_delay: Optional[float] = None,
+                 defer_delay: timedelta = timedelta(minutes=1), clock: Callable[[], float] = time.monotonic):
+        self.dispatchers: Dict[str, MailboxDispatcher] = {it.name: MailboxDispatcher(it) for it in scenarios}
+        self.concurrency = concurrency
+        self.source_weights = source_weights or DefaultSourceWeights
+        self.scenario_weights = scenario_weights or {}
+        self.buckets: Dict[str, TokenBucket] = {name: TokenBucket(rate, burst, clock)
+                                                for name, (rate, burst) in (rate_limits or {}).items()}
+        self.shed_threshold = shed_threshold
+        self.max_delay = max_delay
+        self.defer_delay = defer_delay
+        self.clock = clock
+        self.queues: Dict[QueueKey, Deque[Admission]] = {}
+        self.current: Dict[QueueKey, int] = {}  # current weights of round robin
+        self.ready = asyncio.Event()
+        self.shed = 0
+
+    def get_weight(self, key: QueueKey) -> int:
+        source, name = key
+        return self.source_weights.get(source, 1) * self.scenario_weights.get(name, 1)
+
+    async def submit(self, name: str, scenario_id: ScenarioId, event: ScenarioEvent,
+                     source: EventSource = EventSource.External) -> None:
+        """
+        Queue event and wait until it processed or deferred
+        """
+        if name not in self.dispatchers:
+            raise KeyError(f'Unknown scenario {name}')
+        key = (source, name)
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.current[key] = 0
+        if (source == EventSource.Scheduled and event is not PLANNED
+                and self.shed_threshold is not None and len(queue) >= self.shed_threshold):
+            await self.defer(name, scenario_id, event)
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue.append((scenario_id, event, future, self.clock()))
+        self.ready.set()
+        await future
+
+    async def submit_planned(self, name: str, scenario_id: ScenarioId) -> None:
+        """
+        Queue run of event planned in store, see Scenario.run_planned
+        """
+        await self.submit(name, scenario_id, PLANNED, EventSource.Scheduled)
+
+    async def defer(self, name: str, scenario_id: ScenarioId, event: ScenarioEvent) -> None:
+        self.shed += 1
+        task_name = ScenarioTaskName % name
+        # newer task of scenario, scheduled meanwhile, is kept
+        await self.dispatchers[name].scenario.scheduler.schedule(self.defer_delay, task_name, scenario_id, event,
+                                                                 task_id=f'{task_name}:{scenario_id}')
+
+    def select(self) -> Optional[QueueKey]:
+        """
+        Choose queue by smooth weighted round robin among not empty and not throttled ones
+        """
+        selected, total = None, 0
+        for key, queue in self.queues.items():
+            if not queue:
+                continue
+            bucket = self.buckets.get(key[1])
+            if bucket and bucket.refill() < 1:
+                continue
+            weight = self.get_weight(key)
+            total += weight
+            self.current[key] += weight
+            if selected is None or self.current[key] > self.current[selected]:
+                selected = key
+        if selected:
+            self.current[selected] -= total
+            bucket = self.buckets.get(selected[1])
+            if bucket:
+                bucket.take()
+        return selected
+
+    def get_throttle_time(self) -> Optional[float]:
+        waits = [self.buckets[name].wait_time() for (_, name), queue in self.queues.items()
+                 if queue and name in self.buckets]
+        return min(waits) if waits else None
+
+    async def take(self) -> Tuple[QueueKey, Admission]:
+        while True:
+            key = self.select()
+            if key:
+                return key, self.queues[key].popleft()
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), self.get_throttle_time())
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        workers = [asyncio.ensure_future(self.work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def work(self) -> None:
+        while True:
+            (source, name), (scenario_id, event, future, enqueued) = await self.take()
+            if future.done():
+                continue
+            try:
+                if (source == EventSource.Scheduled and event is not PLANNED and self.max_delay is not None
+                        and self.clock() - enqueued > self.max_delay):
+                    await self.defer(name, scenario_id, event)
+                elif event is PLANNED:
+                    await self.dispatchers[name].dispatch_planned(scenario_id)
+                else:
+                    await self.dispatchers[name].dispatch(scenario_id, event)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(None)
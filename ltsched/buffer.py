@@ -0,0 +1,82 @@
+import asyncio
+from functools import partial
+from itertools import count
+from typing import Any, Dict, Iterable, Optional, Union
+
+from .protocols import ScheduleRequest, TaskScheduler, TimePoint
+
+RequestKey = Union[str, int]  # task id, or sequence number of request without id
+
+
+class BufferedTaskScheduler:
+    """
+    Wrapper of task scheduler, which collect schedule requests during window seconds and pass them
+    in one schedule_many call, or one by one, if scheduler has no schedule_many. Requests with same task id
+    are coalesced as scheduler would apply them: later forced request replaces earlier one, not forced is dropped.
+    Schedule returns when its batch is passed to scheduler. Other methods of scheduler are passed through
+    """
+
+    def __init__(self, scheduler: TaskScheduler, window: float = 0.01, max_size: int = 1000):
+        self.scheduler = scheduler
+        self.window = window
+        self.max_size = max_size
+        self.pending: Dict[RequestKey, ScheduleRequest] = {}
+        self.sequence = count()
+        self.flush_task: Optional[asyncio.Future] = None
+        self.window_handle: Optional[asyncio.TimerHandle] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.scheduler, name)
+
+    async def schedule(self, point: TimePoint, task_name: str, *args,
+                       task_id: Optional[str] = None, force: bool = False) -> None:
+        await self.schedule_many((ScheduleRequest(point, task_name, args, task_id, force),))
+
+    async def schedule_many(self, requests: Iterable[ScheduleRequest]) -> None:
+        for request in requests:
+            key = next(self.sequence) if request.task_id is None else request.task_id
+            if request.force or key not in self.pending:
+                self.pending[key] = request
+        if self.flush_task is None:
+            loop = asyncio.get_running_loop()
+            self.flush_task = loop.create_future()
+            self.window_handle = loop.call_later(self.window, self.start_flush)
+        flush_task = self.flush_task
+        if len(self.pending) >= self.max_size:
+            self.start_flush()
+        await asyncio.shield(flush_task)
+
+    def start_flush(self) -> None:
+        if self.window_handle:
+            self.window_handle.cancel()
+            self.window_handle = None
+        waiter, self.flush_task = self.flush_task, None
+        requests = list(self.pending.values())
+        self.pending = {}
+        asyncio.ensure_future(self.send(requests)).add_done_callback(partial(self.finish, waiter))
+
+    @staticmethod
+    def finish(waiter: asyncio.Future, task: asyncio.Future) -> None:
+        if task.cancelled():
+            waiter.cancel()
+        elif task.exception():
+            waiter.set_exception(task.exception())
+        else:
+            waiter.set_result(None)
+
+    async def send(self, requests: Iterable[ScheduleRequest]) -> None:
+        bulk_schedule = getattr(self.scheduler, 'schedule_many', None)
+        if bulk_schedule:
+            await bulk_schedule(requests)
+        else:
+            for it in requests:
+                await self.scheduler.schedule(it.point, it.task_name, *it.args, task_id=it.task_id, force=it.force)
+
+    async def flush(self) -> None:
+        """
+        Pass collected requests to scheduler without waiting for window end
+        """
+        if self.flush_task is not None:
+            flush_task = self.flush_task
+            self.start_flush()
+            await flush_task
@@ -0,0 +1,125 @@
+import asyncio
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from .model import ScenarioId, ScenarioStore
+from .protocols import ScenarioStoreRepo
+
+CacheEntry = Tuple[int, ScenarioStore]  # (version, store)
+
+
+class CachedScenarioStoreRepo:
+    """
+    Read-through LRU cache over any store repo. Write of store equal to cached one is skipped.
+    Every read from repo and every write give cached store new version from counter of cache, so compare_and_set
+    may detect concurrent writes made through this cache. Version of evicted store is unknown and compare_and_set
+    of it fails, as after concurrent write. Other methods of repo (search_planned etc.) are passed through
+    """
+
+    def __init__(self, repo: ScenarioStoreRepo, max_size: int = 10000):
+        self.repo = repo
+        self.max_size = max_size
+        self.entries: OrderedDict[ScenarioId, CacheEntry] = OrderedDict()
+        self.version = 0
+
+    def next_version(self) -> int:
+        self.version += 1
+        return self.version
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repo, name)
+
+    def put(self, identity: ScenarioId, store: ScenarioStore, version: int) -> None:
+        self.entries[identity] = (version, deepcopy(store))
+        self.entries.move_to_end(identity)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, identity: ScenarioId) -> None:
+        self.entries.pop(identity, None)
+
+    async def read_versioned(self, identity: ScenarioId) -> Tuple[int, Optional[ScenarioStore]]:
+        entry = self.entries.get(identity)
+        if entry:
+            self.entries.move_to_end(identity)
+            return entry[0], deepcopy(entry[1])
+        store = await self.repo.read_store(identity)
+        if not store:
+            return 0, store
+        version = self.next_version()
+        self.put(identity, store, version)
+        return version, store
+
+    async def read_store(self, identity: ScenarioId) -> Optional[ScenarioStore]:
+        _, store = await self.read_versioned(identity)
+        return store
+
+    async def read_stores(self, identities: Iterable[ScenarioId]) -> Mapping[ScenarioId, Optional[ScenarioStore]]:
+        result: Dict[ScenarioId, Optional[ScenarioStore]] = {}
+        missed = []
+        for identity in identities:
+            entry = self.entries.get(identity)
+            if entry:
+                self.entries.move_to_end(identity)
+                result[identity] = deepcopy(entry[1])
+            else:
+                missed.append(identity)
+        if missed:
+            bulk_read = getattr(self.repo, 'read_stores', None)
+            if bulk_read:
+                stores = await bulk_read(missed)
+            else:
+                stores = dict(zip(missed, await asyncio.gather(*(self.repo.read_store(it) for it in missed))))
+            for identity in missed:
+                store = result[identity] = stores.get(identity)
+                if store:
+                    self.put(identity, store, self.next_version())
+        return result
+
+    def is_dirty(self, identity: ScenarioId, store: ScenarioStore) -> bool:
+        entry = self.entries.get(identity)
+        if entry and entry[1] == store:
+            self.entries.move_to_end(identity)
+            return False
+        return True
+
+    def stamp(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        self.put(identity, store, self.next_version())
+
+    async def write_store(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        if self.is_dirty(identity, store):
+            await self.write_stores({identity: store})
+
+    async def write_stores(self, stores: Mapping[ScenarioId, ScenarioStore]) -> None:
+        dirty = {k: v for k, v in stores.items() if self.is_dirty(k, v)}
+        if not dirty:
+            return
+        # stamp before write, so concurrent compare_and_set see new version
+        for identity, store in dirty.items():
+            self.stamp(identity, store)
+        try:
+            bulk_write = getattr(self.repo, 'write_stores', None)
+            if bulk_write:
+                await bulk_write(dirty)
+            else:
+                await asyncio.gather(*(self.repo.write_store(k, v) for k, v in dirty.items()))
+        except BaseException:
+            for identity in dirty:
+                self.invalidate(identity)
+            raise
+
+    async def compare_and_set(self, identity: ScenarioId, store: ScenarioStore, version: int) -> bool:
+        """
+        Write store only if its cached version is still the one, returned by read_versioned.
+        Store evicted from cache is not written, it must be read again
+        """
+        entry = self.entries.get(identity)
+        if not entry or entry[0] != version:
+            return False
+        await self.write_store(identity, store)
+        return True
+
+    async def search_planned(self, before: datetime) -> Iterable[ScenarioId]:
+        return await self.repo.search_planned(before)
@@ -0,0 +1,310 @@
+import pickle
+import struct
+import zlib
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from .model import BaseScenarioStore, ScenarioError, ScenarioEvent, ScenarioExecutionStatus, ScenarioStore
+from .scenario import Scenario, to_str
+
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<BI')  # (format version, schema fingerprint)
+
+# value tags
+NONE, TRUE, FALSE, INT, FLOAT, STR, BYTES, DATETIME, LIST, TUPLE, DICT, PICKLE = range(12)
+# event tags
+EVENT_STR, EVENT_OBJECT, EVENT_PICKLE = range(3)
+
+EXEC_STATES = tuple(ScenarioExecutionStatus)
+EXEC_STATE_INDEX = {it: i for i, it in enumerate(EXEC_STATES)}
+BASE_FIELDS = tuple(it.name for it in fields(BaseScenarioStore))
+FLOAT_STRUCT = struct.Struct('<d')
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def write_bytes(buffer: bytearray, value: bytes) -> None:
+    write_varint(buffer, len(value))
+    buffer += value
+
+
+def read_bytes(data: bytes, pos: int) -> Tuple[bytes, int]:
+    size, pos = read_varint(data, pos)
+    return data[pos:pos + size], pos + size
+
+
+def write_value(buffer: bytearray, value: Any) -> None:
+    kind = type(value)
+    if value is None:
+        buffer.append(NONE)
+    elif kind is bool:
+        buffer.append(TRUE if value else FALSE)
+    elif kind is int:
+        buffer.append(INT)
+        write_varint(buffer, value << 1 if value >= 0 else (-value << 1) - 1)
+    elif kind is float:
+        buffer.append(FLOAT)
+        buffer += FLOAT_STRUCT.pack(value)
+    elif kind is str:
+        buffer.append(STR)
+        write_bytes(buffer, value.encode())
+    elif kind is bytes:
+        buffer.append(BYTES)
+        write_bytes(buffer, value)
+    elif kind is datetime:
+        buffer.append(DATETIME)
+        write_bytes(buffer, value.isoformat().encode())
+    elif kind is list or kind is tuple:
+        buffer.append(LIST if kind is list else TUPLE)
+        write_varint(buffer, len(value))
+        for it in value:
+            write_value(buffer, it)
+    elif kind is dict:
+        buffer.append(DICT)
+        write_varint(buffer, len(value))
+        for k, v in value.items():
+            write_value(buffer, k)
+            write_value(buffer, v)
+    else:
+        buffer.append(PICKLE)
+        write_bytes(buffer, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def read_value(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+    if tag == NONE:
+        return None, pos
+    elif tag == TRUE or tag == FALSE:
+        return tag == TRUE, pos
+    elif tag == INT:
+        value, pos = read_varint(data, pos)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+    elif tag == FLOAT:
+        return FLOAT_STRUCT.unpack_from(data, pos)[0], pos + FLOAT_STRUCT.size
+    elif tag == STR:
+        value, pos = read_bytes(data, pos)
+        return value.decode(), pos
+    elif tag == BYTES:
+        return read_bytes(data, pos)
+    elif tag == DATETIME:
+        value, pos = read_bytes(data, pos)
+        return datetime.fromisoformat(value.decode()), pos
+    elif tag == LIST or tag == TUPLE:
+        size, pos = read_varint(data, pos)
+        items = []
+        for _ in range(size):
+            item, pos = read_value(data, pos)
+            items.append(item)
+        return (items if tag == LIST else tuple(items)), pos
+    elif tag == DICT:
+        size, pos = read_varint(data, pos)
+        result = {}
+        for _ in range(size):
+            key, pos = read_value(data, pos)
+            result[key], pos = read_value(data, pos)
+        return result, pos
+    elif tag == PICKLE:
+        value, pos = read_bytes(data, pos)
+        return pickle.loads(value), pos
+    raise ScenarioError(f'Unknown value tag {tag}')
+
+
+class SymbolTable:
+    """
+    Intern known strings to small integers. Unknown strings are written inline
+    """
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols: List[str] = sorted(set(symbols))
+        self.index: Dict[str, int] = {it: i + 1 for i, it in enumerate(self.symbols)}
+
+    def write(self, buffer: bytearray, value: str) -> None:
+        index = self.index.get(value)
+        if index:
+            write_varint(buffer, index)
+        else:
+            buffer.append(0)
+            write_bytes(buffer, value.encode())
+
+    def read(self, data: bytes, pos: int) -> Tuple[str, int]:
+        index, pos = read_varint(data, pos)
+        if index:
+            return self.symbols[index - 1], pos
+        value, pos = read_bytes(data, pos)
+        return value.decode(), pos
+
+
+@dataclass(frozen=True)
+class CodecSchema:
+    """
+    Symbols and fields, with which data is encoded. Schema is plain tuples, so it may be pickled or saved as json
+    and passed to codec of changed scenario to read data written before change
+    """
+    states: Tuple[str, ...]
+    events: Tuple[str, ...]
+    extra_fields: Tuple[str, ...]
+    event_fields: Tuple[Tuple[str, Tuple[str, ...]], ...]  # ((event type, fields), ...)
+
+    @property
+    def fingerprint(self) -> int:
+        schema = [*self.states, '', *self.events, '', *self.extra_fields]
+        for name, names in self.event_fields:
+            schema += ['', name, *names]
+        return zlib.crc32('\n'.join(schema).encode())
+
+
+class SchemaTables:
+    """
+    Symbol tables and fields of one schema
+    """
+
+    def __init__(self, schema: CodecSchema):
+        self.schema = schema
+        self.states = SymbolTable(schema.states)
+        self.events = SymbolTable(schema.events)
+        self.event_fields: Dict[str, Tuple[str, ...]] = dict(schema.event_fields)
+
+
+def scenario_states(scenario: Type[Scenario]) -> List[str]:
+    return list(scenario.graph.states)
+
+
+def scenario_events(scenario: Type[Scenario]) -> List[str]:
+    events = {it for state_events in scenario.event_handlers.values() for it in state_events}
+    events.discard('*')
+    return sorted(events)
+
+
+class ScenarioCodec:
+    """
+    Compact versioned binary format of stores and events of scenario class.
+    State names and event types known from scenario handlers are interned to small integers, event objects
+    are written by fields if their classes are registered and pickled otherwise. Store fields beyond base ones
+    are written in declaration order. Header keeps fingerprint of schema (these symbols and fields), data is
+    decoded with schema it was written with: current one or one of previous_schemas, saved from codec.schema
+    before scenario got new states, events or fields. Fields removed since are dropped, new ones get defaults
+    """
+
+    def __init__(self, scenario: Type[Scenario], store_type: Type[ScenarioStore] = BaseScenarioStore,
+                 event_types: Iterable[type] = (), previous_schemas: Iterable[CodecSchema] = ()):
+        self.store_type = store_type
+        self.event_types: Dict[str, type] = {to_str(it.type): it for it in event_types}
+        self.event_fields: Dict[type, Tuple[str, ...]] = {it: tuple(f.name for f in fields(it))
+                                                          for it in self.event_types.values()}
+        self.extra_fields = tuple(it.name for it in fields(store_type) if it.name not in BASE_FIELDS)
+        self.schema = CodecSchema(
+            states=tuple(sorted(set(scenario_states(scenario)))),
+            events=tuple(sorted(set(scenario_events(scenario)) | set(self.event_types))),
+            extra_fields=self.extra_fields,
+            event_fields=tuple((it, self.event_fields[self.event_types[it]]) for it in sorted(self.event_types)))
+        self.tables = SchemaTables(self.schema)
+        self.states = self.tables.states
+        self.events = self.tables.events
+        self.fingerprint = self.schema.fingerprint
+        self.header = HEADER.pack(FORMAT_VERSION, self.fingerprint)
+        self.schemas: Dict[int, SchemaTables] = {it.fingerprint: SchemaTables(it) for it in previous_schemas}
+        self.schemas[self.fingerprint] = self.tables
+
+    def write_event(self, buffer: bytearray, event: ScenarioEvent) -> None:
+        if isinstance(event, str):
+            buffer.append(EVENT_STR)
+            self.events.write(buffer, event)
+            return
+        names = self.event_fields.get(type(event))
+        if names is None:
+            buffer.append(EVENT_PICKLE)
+            write_bytes(buffer, pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+            return
+        buffer.append(EVENT_OBJECT)
+        self.events.write(buffer, to_str(event.type))
+        for name in names:
+            write_value(buffer, getattr(event, name))
+
+    def read_event(self, tables: SchemaTables, data: bytes, pos: int) -> Tuple[ScenarioEvent, int]:
+        tag = data[pos]
+        if tag == EVENT_PICKLE:
+            value, pos = read_bytes(data, pos + 1)
+            return pickle.loads(value), pos
+        event_type, pos = tables.events.read(data, pos + 1)
+        if tag == EVENT_STR:
+            return event_type, pos
+        event_class = self.event_types.get(event_type)
+        if event_class is None:
+            raise ScenarioError(f'Event object {event_type!r} is not registered in event_types of codec')
+        current = set(self.event_fields[event_class])
+        values = {}
+        for name in tables.event_fields[event_type]:
+            value, pos = read_value(data, pos)
+            if name in current:
+                values[name] = value
+        return event_class(**values), pos
+
+    def encode_event(self, event: ScenarioEvent) -> bytes:
+        buffer = bytearray(self.header)
+        self.write_event(buffer, event)
+        return bytes(buffer)
+
+    def decode_event(self, data: bytes) -> ScenarioEvent:
+        event, _ = self.read_event(self.get_tables(data), data, HEADER.size)
+        return event
+
+    def encode_store(self, store: ScenarioStore) -> bytes:
+        buffer = bytearray(self.header)
+        self.states.write(buffer, store.state)
+        buffer.append(EXEC_STATE_INDEX[store.exec_state])
+        write_value(buffer, store.error)
+        write_value(buffer, store.next_run)
+        if store.next_event is None:
+            buffer.append(0)
+        else:
+            buffer.append(1)
+            self.write_event(buffer, store.next_event)
+        for name in self.extra_fields:
+            write_value(buffer, getattr(store, name))
+        return bytes(buffer)
+
+    def decode_store(self, data: bytes) -> ScenarioStore:
+        tables = self.get_tables(data)
+        state, pos = tables.states.read(data, HEADER.size)
+        exec_state = EXEC_STATES[data[pos]]
+        error, pos = read_value(data, pos + 1)
+        next_run, pos = read_value(data, pos)
+        next_event = None
+        pos += 1
+        if data[pos - 1]:
+            next_event, pos = self.read_event(tables, data, pos)
+        current = set(self.extra_fields)
+        extra = {}
+        for name in tables.schema.extra_fields:
+            value, pos = read_value(data, pos)
+            if name in current:
+                extra[name] = value
+        return self.store_type(state=state, exec_state=exec_state, error=error, next_run=next_run,
+                               next_event=next_event, **extra)
+
+    def get_tables(self, data: bytes) -> SchemaTables:
+        if len(data) < HEADER.size or data[0] != FORMAT_VERSION:
+            raise ScenarioError(f'Unsupported codec version {data[0] if data else None}')
+        tables: Optional[SchemaTables] = self.schemas.get(HEADER.unpack_from(data)[1])
+        if tables is None:
+            raise ScenarioError('Data is encoded with other schema of scenario states, events or store fields, '
+                                'pass that schema in previous_schemas of codec')
+        return tables
@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from copy import deepcopy
+from itertools import chain
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from .model import ScenarioEvent, ScenarioExecutionStatus, ScenarioId
+from .scenario import HandlerResult, RunContext, Scenario
+
+Mail = Tuple[ScenarioEvent, asyncio.Future]
+PLANNED = object()  # mail for run of event planned in store
+
+
+class MailboxDispatcher:
+    """
+    Run events of scenario one by one in order of arrival. While scenario has queued events, its store stay
+    in memory and written once, when queue is empty. Mailbox is drained in own task, so cancelled caller
+    does not affect events of other callers, and its own event is still processed
+    """
+
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.mailboxes: Dict[ScenarioId, Deque[Mail]] = {}
+        self.draining: Set[asyncio.Future] = set()
+
+    async def dispatch(self, scenario_id: ScenarioId, event: ScenarioEvent) -> None:
+        """
+        Put event to mailbox of scenario and wait until it processed and store written
+        """
+        future = asyncio.get_running_loop().create_future()
+        mailbox = self.mailboxes.get(scenario_id)
+        if mailbox is not None:
+            mailbox.append((event, future))
+        else:
+            mailbox = self.mailboxes[scenario_id] = deque(((event, future),))
+            drain = asyncio.ensure_future(self.drain(scenario_id, mailbox))
+            self.draining.add(drain)
+            drain.add_done_callback(self.draining.discard)
+        await asyncio.shield(future)
+
+    async def dispatch_planned(self, scenario_id: ScenarioId) -> None:
+        """
+        Put run of event planned in store to mailbox of scenario, see Scenario.run_planned
+        """
+        await self.dispatch(scenario_id, PLANNED)
+
+    async def drain(self, scenario_id: ScenarioId, mailbox: Deque[Mail]) -> None:
+        scenario = self.scenario
+        processed: List[asyncio.Future] = []
+        try:
+            with scenario.use_context(RunContext(scenario_id)) as context:
+                await scenario.read_store()
+                while mailbox:
+                    processed.clear()
+                    next_run: Optional[HandlerResult] = None
+                    while mailbox:
+                        event, future = mailbox.popleft()
+                        if context.store.exec_state != ScenarioExecutionStatus.Run:
+                            future.set_result(None)
+                            continue
+                        snapshot = deepcopy(context.store), context.event, context.result
+                        if event is PLANNED:
+                            store = context.store
+                            if (store.next_event is None or store.next_run is None
+                                    or store.next_run > scenario.clock()):
+                                future.set_result(None)
+                                continue
+                            event = store.next_event
+                            store.next_run = store.next_event = None
+                        context.event = event
+                        try:
+                            result = await scenario.process_event(event)
+                        except Exception as e:
+                            context.store, context.event, context.result = snapshot
+                            future.set_exception(e)
+                            continue
+                        processed.append(future)
+                        if result.next_event:
+                            next_run = result
+                    if processed:
+                        try:
+                            await scenario.write_store()
+                            if next_run:
+                                await scenario.schedule_next_run(next_run)
+                        except Exception as e:
+                            for future in processed:
+                                future.set_exception(e)
+                            raise
+                        for future in processed:
+                            future.set_result(None)
+        except Exception as e:
+            while mailbox:
+                _, future = mailbox.popleft()
+                future.set_exception(e)
+        finally:
+            del self.mailboxes[scenario_id]
+            for future in chain(processed, (it[1] for it in mailbox)):
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,210 @@
+import asyncio
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import fields
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .memory import MemoryScenarioStoreRepo
+from .model import ScenarioEvent, ScenarioId, ScenarioStore
+from .scenario import HandlerResult, current_run_context
+
+HEADER = struct.Struct('<II')  # (payload size, crc32 of payload)
+FULL, DELTA = 'full', 'delta'
+# (kind, scenario id, event of run, result of event, store for full record or {field: value} for delta)
+Record = Tuple[str, ScenarioId, Optional[ScenarioEvent], Optional[HandlerResult], Any]
+
+
+class Segment:
+    """
+    Preallocated memory-mapped file of records. Zero size or wrong crc mark end of written records
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.file = open(path, 'a+b')
+        if os.path.getsize(path) < size:
+            self.file.truncate(size)
+        self.size = os.path.getsize(path)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.position = 0
+
+    def append(self, payload: bytes) -> bool:
+        end = self.position + HEADER.size + len(payload)
+        if end > self.size:
+            return False
+        HEADER.pack_into(self.map, self.position, len(payload), zlib.crc32(payload))
+        self.map[self.position + HEADER.size:end] = payload
+        self.position = end
+        return True
+
+    def payloads(self) -> Iterator[bytes]:
+        while self.position + HEADER.size <= self.size:
+            size, crc = HEADER.unpack_from(self.map, self.position)
+            start = self.position + HEADER.size
+            payload = self.map[start:start + size]
+            if not size or len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            self.position = start + size
+            yield payload
+
+    def close(self) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class JournalScenarioStoreRepo(MemoryScenarioStoreRepo):
+    """
+    Event-sourced store repo. Stores are kept in memory, every write appends to log only changed fields
+    with event of current scenario run and its HandlerResult, so next event and run time are kept in log
+    also for scenarios, which plan them in scheduler. Log is split to memory-mapped segments, after every snapshot_every
+    records all stores are written to snapshot and new segment started. On start stores are loaded from latest
+    snapshot and segments after it are replayed. Segments before snapshot are kept as history, if keep_history set.
+    Records are pickled in event loop, segment and snapshot files are written from dedicated thread
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 100000, segment_size: int = 16 * 1024 * 1024,
+                 keep_history: bool = True):
+        super().__init__()
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.segment_size = segment_size
+        self.keep_history = keep_history
+        self.fields: Dict[type, Tuple[str, ...]] = {}
+        self.records = 0
+        self.sequence = 0
+        self.segment: Optional[Segment] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ltsched-journal')
+        os.makedirs(path, exist_ok=True)
+        self.recover()
+
+    async def execute(self, func, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def file_path(self, kind: str, sequence: int) -> str:
+        return os.path.join(self.path, f'{kind}-{sequence:08d}')
+
+    def list_files(self, kind: str) -> List[int]:
+        prefix = f'{kind}-'
+        return sorted(int(it[len(prefix):]) for it in os.listdir(self.path)
+                      if it.startswith(prefix) and it[len(prefix):].isdigit())
+
+    def recover(self) -> None:
+        snapshots = self.list_files('snapshot')
+        start = snapshots[-1] if snapshots else 0
+        if snapshots:
+            with open(self.file_path('snapshot', start), 'rb') as file:
+                for identity, store in pickle.load(file).items():
+                    self.stores[identity] = store
+                    self.plan(identity, store)
+        segments = [it for it in self.list_files('segment') if it >= start]
+        for sequence in segments:
+            for kind, identity, _, _, data in self.read_segment(sequence):
+                if kind == FULL:
+                    store = data
+                else:
+                    store = self.stores[identity]
+                    for name, value in data.items():
+                        setattr(store, name, value)
+                self.stores[identity] = store
+                self.plan(identity, store)
+                self.records += 1
+        self.sequence = max(segments[-1] + 1 if segments else 0, start)
+        self.segment = Segment(self.file_path('segment', self.sequence), self.segment_size)
+
+    def read_segment(self, sequence: int) -> Iterator[Record]:
+        segment = Segment(self.file_path('segment', sequence), 0)
+        try:
+            for payload in segment.payloads():
+                yield pickle.loads(payload)
+        finally:
+            segment.close()
+
+    async def history(self, identity: ScenarioId) -> List[Record]:
+        """
+        Records of scenario from kept segments, current segment is read after flush
+        """
+        return await self.execute(self.read_history, identity)
+
+    def read_history(self, identity: ScenarioId) -> List[Record]:
+        self.segment.map.flush()
+        return [record for sequence in self.list_files('segment') for record in self.read_segment(sequence)
+                if record[1] == identity]
+
+    def append(self, payload: bytes) -> None:
+        if not self.segment.append(payload):
+            self.segment.close()
+            self.sequence += 1
+            self.segment = Segment(self.file_path('segment', self.sequence),
+                                   max(self.segment_size, HEADER.size + len(payload)))
+            self.segment.append(payload)
+
+    def get_fields(self, store: ScenarioStore) -> Tuple[str, ...]:
+        names = self.fields.get(type(store))
+        if names is None:
+            names = self.fields[type(store)] = tuple(it.name for it in fields(store))
+        return names
+
+    async def read_store(self, identity: ScenarioId) -> Optional[ScenarioStore]:
+        store = self.stores.get(identity)
+        return deepcopy(store) if store else None
+
+    async def write_store(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        context = current_run_context()
+        event = result = None
+        if context and context.scenario_id == identity:
+            event, result = context.event, context.result
+        prior = self.stores.get(identity)
+        if prior is None or type(prior) is not type(store):
+            record: Record = (FULL, identity, event, result, store)
+        else:
+            delta = {it: getattr(store, it) for it in self.get_fields(store)
+                     if getattr(store, it) != getattr(prior, it)}
+            if not delta:
+                return
+            record = (DELTA, identity, event, result, delta)
+        payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        self.stores[identity] = deepcopy(store)
+        self.plan(identity, store)
+        self.records += 1
+        snapshot = self.records >= self.snapshot_every
+        if snapshot:
+            self.records = 0
+        await self.execute(self.append, payload)
+        if snapshot:
+            await self.snapshot()
+
+    async def snapshot(self) -> None:
+        """
+        Write all stores to snapshot and start new segment
+        """
+        # stores are replaced on write and never changed in place, so copy of dict is consistent snapshot
+        await self.execute(self.write_snapshot, dict(self.stores))
+
+    def write_snapshot(self, stores: Dict[ScenarioId, ScenarioStore]) -> None:
+        self.segment.close()
+        self.sequence += 1
+        path = self.file_path('snapshot', self.sequence)
+        with open(f'{path}.tmp', 'wb') as file:
+            pickle.dump(stores, file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f'{path}.tmp', path)
+        if not self.keep_history:
+            for sequence in self.list_files('segment'):
+                os.remove(self.file_path('segment', sequence))
+            for sequence in self.list_files('snapshot')[:-1]:
+                os.remove(self.file_path('snapshot', sequence))
+        self.segment = Segment(self.file_path('segment', self.sequence), self.segment_size)
+
+    async def flush(self) -> None:
+        await self.execute(self.segment.map.flush)
+
+    async def close(self) -> None:
+        await self.execute(self.segment.close)
+        self.executor.shutdown()
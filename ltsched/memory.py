@@ -0,0 +1,114 @@
+from copy import copy
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from typing import AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .model import ScenarioExecutionStatus, ScenarioId, ScenarioStore
+
+
+class MemoryScenarioStoreRepo:
+    """
+    Store repo, which keep stores in memory. Planned runs are indexed by heap on next_run, so search_planned
+    find due scenarios without scan of all stores. Search does not change plan, as in other repos,
+    pop_planned removes found scenarios from plan until their stores written again.
+    Stores are shallow copied on read and write
+    """
+
+    def __init__(self):
+        self.stores: Dict[ScenarioId, ScenarioStore] = {}
+        self.planned: Dict[ScenarioId, datetime] = {}
+        self.plan_index: List[Tuple[datetime, ScenarioId]] = []
+
+    async def read_store(self, identity: ScenarioId) -> Optional[ScenarioStore]:
+        store = self.stores.get(identity)
+        return copy(store) if store else None
+
+    async def write_store(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        self.stores[identity] = copy(store)
+        self.plan(identity, store)
+
+    async def read_stores(self, identities: Iterable[ScenarioId]) -> Mapping[ScenarioId, Optional[ScenarioStore]]:
+        return {it: await self.read_store(it) for it in identities}
+
+    async def write_stores(self, stores: Mapping[ScenarioId, ScenarioStore]) -> None:
+        for identity, store in stores.items():
+            await self.write_store(identity, store)
+
+    async def search_planned(self, before: datetime) -> List[ScenarioId]:
+        return self.find_planned(before)
+
+    async def iter_planned(self, before: datetime, batch_size: int) -> AsyncIterator[List[ScenarioId]]:
+        # found before first page, as writes of consumer change index
+        identities = self.find_planned(before)
+        for start in range(0, len(identities), batch_size):
+            yield identities[start:start + batch_size]
+
+    async def next_planned(self, after: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Return nearest planned run, or nearest one later than after. Heap index is walked from root
+        as in find_planned, so only runs up to after and their children are visited
+        """
+        index = self.plan_index
+        while index and self.planned.get(index[0][1]) != index[0][0]:
+            heappop(index)
+        if after is None:
+            return index[0][0] if index else None
+        front = [(index[0], 0)] if index else []
+        while front:
+            (next_run, identity), position = heappop(front)
+            if next_run > after and self.planned.get(identity) == next_run:
+                return next_run
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(index):
+                    heappush(front, (index[child], child))
+        return None
+
+    def find_planned(self, before: datetime) -> List[ScenarioId]:
+        """
+        Return scenarios planned before time in order of next_run. Heap index is walked from root
+        by children of smallest entries, so only due entries and their children are visited
+        """
+        result = []
+        index = self.plan_index
+        front = [(index[0], 0)] if index else []
+        while front:
+            (next_run, identity), position = heappop(front)
+            if next_run >= before:
+                break
+            if self.planned.get(identity) == next_run:
+                result.append(identity)
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(index):
+                    heappush(front, (index[child], child))
+        return list(dict.fromkeys(result))
+
+    def pop_planned(self, before: datetime, limit: Optional[int] = None) -> List[ScenarioId]:
+        """
+        Remove from plan and return scenarios planned before time, up to limit. Removed scenario is planned again
+        by next write of its store
+        """
+        result = []
+        index = self.plan_index
+        while index and index[0][0] < before and (limit is None or len(result) < limit):
+            next_run, identity = heappop(index)
+            if self.planned.get(identity) == next_run:
+                del self.planned[identity]
+                result.append(identity)
+        return result
+
+    def plan(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        next_run = store.next_run if store.exec_state == ScenarioExecutionStatus.Run else None
+        if next_run is None:
+            self.planned.pop(identity, None)
+        elif self.planned.get(identity) != next_run:
+            self.planned[identity] = next_run
+            heappush(self.plan_index, (next_run, identity))
+            if len(self.plan_index) > 2 * len(self.planned) + 1024:
+                self.compact()
+
+    def compact(self) -> None:
+        """
+        Drop index entries, which was replaced by later writes
+        """
+        self.plan_index = [(v, k) for k, v in self.planned.items()]
+        heapify(self.plan_index)
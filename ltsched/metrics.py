@@ -0,0 +1,93 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+SUB_BUCKET_BITS = 7
+MetricsKey = Tuple[str, str, Optional[str], Optional[str], Optional[str]]  # (scenario, phase, state, event, handler)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in microseconds with constant memory and relative error below 1%,
+    values of every power of two are spread to 2 ** SUB_BUCKET_BITS buckets
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets: List[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def index(value: int) -> int:
+        shift = max(value.bit_length() - SUB_BUCKET_BITS - 1, 0)
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def upper_bound(index: int) -> int:
+        shift, sub = divmod(index, 1 << SUB_BUCKET_BITS)
+        if shift:
+            shift, sub = shift - 1, sub + (1 << SUB_BUCKET_BITS)
+        return ((sub + 1) << shift) - 1
+
+    def record(self, duration: float) -> None:
+        """
+        Record duration in seconds
+        """
+        index = self.index(int(duration * 1e6))
+        if index >= len(self.buckets):
+            self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, percent: float) -> float:
+        """
+        Upper bound in seconds of duration, which is not exceeded by percent of recorded ones
+        """
+        if not self.count:
+            return 0.0
+        rank = max(percent / 100 * self.count, 1)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(index) / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class MetricsObserver:
+    """
+    Scenario observer, which collects latency histograms by scenario, phase, state, event type and handler,
+    and counts transitions between states
+    """
+
+    def __init__(self):
+        self.histograms: Dict[MetricsKey, LatencyHistogram] = {}
+        self.transitions: Counter = Counter()
+
+    def observe(self, scenario: str, phase: str, duration: float, state: Optional[str],
+                event_type: Optional[str], handler: Optional[str]) -> None:
+        key = (scenario, phase, state, event_type, handler)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(duration)
+
+    def transition(self, scenario: str, prior_state: str, state: str) -> None:
+        self.transitions[(scenario, prior_state, state)] += 1
+
+    def summary(self, percents: Tuple[float, ...] = (50, 90, 99)) -> Dict[MetricsKey, Dict[str, float]]:
+        result = {}
+        for key, histogram in self.histograms.items():
+            stats = {'count': histogram.count, 'mean': histogram.mean, 'max': histogram.max}
+            stats.update((f'p{it:g}', histogram.percentile(it)) for it in percents)
+            result[key] = stats
+        return result
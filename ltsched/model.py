@@ -1,7 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
 from enum import Enum
-from typing import (ClassVar, NewType, Optional, TypeVar, Union)
+from typing import (ClassVar, List, NewType, Optional, Type, TypeVar, Union)
 
 ScenarioTaskName = 'run:%s'
 
@@ -15,24 +15,59 @@ class ScenarioExecutionStatus(Enum):
     Error = 'error'
 
 
+@dataclass
+class BaseScenarioEventObject:
+    type: ClassVar[str]
+
+
+ScenarioEventObject = TypeVar("ScenarioEventObject", bound=BaseScenarioEventObject)
+ScenarioEvent = Union[str, ScenarioEventObject]
+
+
 @dataclass
 class BaseScenarioStore:
     state: str
     exec_state: ScenarioExecutionStatus = ScenarioExecutionStatus.Run
     error: Optional[str] = None
     next_run: Optional[datetime] = None
+    next_event: Optional[Union[str, BaseScenarioEventObject]] = None
 
 
 ScenarioStore = TypeVar("ScenarioStore", bound=BaseScenarioStore)
 
+T = TypeVar("T")
+
+
+def slotted(cls: Type[T]) -> Type[T]:
+    """
+    Recreate dataclass with __slots__ for its fields, like dataclass(slots=True) of python 3.10
+    """
+    names = tuple(it.name for it in fields(cls) if it.name not in getattr(cls, '__slots__', ()))
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
 
+@slotted
 @dataclass
-class BaseScenarioEventObject:
+class SlottedScenarioEventObject:
+    """
+    Base of slotted event objects, subclass must be slotted too
+    """
     type: ClassVar[str]
 
 
-ScenarioEventObject = TypeVar("ScenarioEventObject", bound=BaseScenarioEventObject)
-ScenarioEvent = Union[str, ScenarioEventObject]
+@slotted
+@dataclass
+class SlottedScenarioStore:
+    """
+    Store with same fields as BaseScenarioStore, but without instance __dict__. Subclass must be slotted too
+    """
+    state: str
+    exec_state: ScenarioExecutionStatus = ScenarioExecutionStatus.Run
+    error: Optional[str] = None
+    next_run: Optional[datetime] = None
+    next_event: Optional[Union[str, BaseScenarioEventObject, SlottedScenarioEventObject]] = None
 
 
 class ScenarioError(Exception):
@@ -41,3 +76,13 @@ class ScenarioError(Exception):
 
 class ScenarioWarning(Exception):
     pass
+
+
+class ScenarioHandlersError(ScenarioError):
+    """
+    Errors of handlers, which run concurrently
+    """
+
+    def __init__(self, message: str, errors: List[BaseException]):
+        super().__init__(message)
+        self.errors = errors
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+from .dispatcher import MailboxDispatcher
+from .model import ScenarioError
+from .protocols import ScenarioId, ScenarioStoreRepo
+from .scenario import Scenario
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_planned(store_repo: ScenarioStoreRepo, before: datetime,
+                       batch_size: int = 1000) -> AsyncIterator[List[ScenarioId]]:
+    """
+    Yield pages of scenarios planned to run before given time. Next page is fetched while current one is processed.
+    Repo without iter_planned is adapted by paging of search_planned result
+    """
+    paged = getattr(store_repo, 'iter_planned', None)
+    pages = paged(before, batch_size) if paged else _paginate(store_repo, before, batch_size)
+    next_page = asyncio.ensure_future(pages.__anext__())
+    try:
+        while True:
+            try:
+                page = await next_page
+            except StopAsyncIteration:
+                return
+            next_page = asyncio.ensure_future(pages.__anext__())
+            yield page
+    finally:
+        next_page.cancel()
+
+
+async def _paginate(store_repo: ScenarioStoreRepo, before: datetime,
+                    batch_size: int) -> AsyncIterator[List[ScenarioId]]:
+    identities = iter(await store_repo.search_planned(before))
+    while True:
+        page = list(islice(identities, batch_size))
+        if not page:
+            return
+        yield page
+
+
+def storage_key(store_repo: ScenarioStoreRepo) -> Hashable:
+    """
+    Identity of storage behind repo: repo wrapped by cache, file and table of file based repos, or repo itself
+    """
+    while 'repo' in getattr(store_repo, '__dict__', ()):
+        store_repo = store_repo.repo
+    path = getattr(store_repo, 'path', None)
+    if isinstance(path, str):
+        return type(store_repo).__name__, os.path.abspath(path), getattr(store_repo, 'table', None)
+    return id(store_repo)
+
+
+class PlannedRunDriver:
+    """
+    Wake up scenarios, which plan next runs in store (see Scenario.plan_in_store).
+    Due scenarios of every scenario store repo are put in bounded queue and run by limited number of workers.
+    Driver sleeps until nearest planned run, if repo know it, but not longer than poll interval.
+    Stores do not keep scenario name, so every scenario must have own repo (e.g. own table of one database).
+    Planned runs go through mailbox dispatchers of scenarios, pass dispatchers used for external events,
+    so planned run and event of one scenario never run concurrently
+    """
+
+    def __init__(self, scenarios: Iterable[Scenario], concurrency: int = 100, queue_size: int = 1000,
+                 batch_size: int = 1000, poll_interval: float = 1.0, clock: Callable[[], datetime] = datetime.now,
+                 dispatchers: Iterable[MailboxDispatcher] = ()):
+        self.scenarios: Dict[str, Scenario] = {it.name: it for it in scenarios}
+        given = {it.scenario.name: it for it in dispatchers}
+        self.dispatchers: Dict[str, MailboxDispatcher] = {k: given.get(k) or MailboxDispatcher(v)
+                                                          for k, v in self.scenarios.items()}
+        storages: Dict[Hashable, str] = {}
+        for name, scenario in self.scenarios.items():
+            other = storages.setdefault(storage_key(scenario.store_repo), name)
+            if other != name:
+                raise ScenarioError(f'Scenarios {other} and {name} share store repo, so their planned runs '
+                                    f'can not be told apart')
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.queue: asyncio.Queue[Tuple[str, ScenarioId]] = asyncio.Queue(queue_size)
+        self.active: Set[Tuple[str, ScenarioId]] = set()
+
+    async def run(self) -> None:
+        workers = [asyncio.ensure_future(self.work()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                await self.sweep()
+                await asyncio.sleep(await self.get_sleep_time())
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def sweep(self) -> None:
+        before = self.clock()
+        for name, scenario in self.scenarios.items():
+            async for page in iter_planned(scenario.store_repo, before, self.batch_size):
+                for scenario_id in page:
+                    key = (name, scenario_id)
+                    if key not in self.active:
+                        self.active.add(key)
+                        await self.queue.put(key)
+
+    async def get_sleep_time(self) -> float:
+        sleep_time = self.poll_interval
+        for scenario in self.scenarios.values():
+            next_planned = getattr(scenario.store_repo, 'next_planned', None)
+            if next_planned:
+                # overdue runs are already in queue, so only future ones shorten sleep
+                now = self.clock()
+                next_run = await next_planned(now)
+                if next_run and next_run > now:
+                    sleep_time = min(sleep_time, (next_run - now).total_seconds())
+        return sleep_time
+
+    async def work(self) -> None:
+        while True:
+            key = await self.queue.get()
+            name, scenario_id = key
+            try:
+                await self.dispatchers[name].dispatch_planned(scenario_id)
+            except Exception:
+                logger.exception('Planned run of %s:%s failed', name, scenario_id)
+            finally:
+                self.active.discard(key)
+                self.queue.task_done()
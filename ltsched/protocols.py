@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Iterable, Optional, Protocol, Union
+from typing import AsyncIterator, Iterable, List, Mapping, NamedTuple, Optional, Protocol, Tuple, Union
 
 from .model import ScenarioId, ScenarioStore
 
@@ -13,6 +13,23 @@ class TaskScheduler(Protocol):
         ...
 
 
+class ScheduleRequest(NamedTuple):
+    point: TimePoint
+    task_name: str
+    args: Tuple
+    task_id: Optional[str] = None
+    force: bool = False
+
+
+class BatchTaskScheduler(TaskScheduler, Protocol):
+    """
+    Task scheduler, which schedule many tasks in one call. Scenario use this method when scheduler has it
+    """
+
+    async def schedule_many(self, requests: Iterable[ScheduleRequest]) -> None:
+        ...
+
+
 class ScenarioStoreRepo(Protocol):
 
     async def read_store(self, identity: ScenarioId) -> Optional[ScenarioStore]:
@@ -23,3 +40,42 @@ class ScenarioStoreRepo(Protocol):
 
     async def search_planned(self, before: datetime) -> Iterable[ScenarioId]:
         ...
+
+
+class BatchScenarioStoreRepo(ScenarioStoreRepo, Protocol):
+    """
+    Store repo, which read and write many stores in one call. Scenario use these methods when repo has them
+    """
+
+    async def read_stores(self, identities: Iterable[ScenarioId]) -> Mapping[ScenarioId, Optional[ScenarioStore]]:
+        ...
+
+    async def write_stores(self, stores: Mapping[ScenarioId, ScenarioStore]) -> None:
+        ...
+
+
+class PagedScenarioStoreRepo(ScenarioStoreRepo, Protocol):
+    """
+    Store repo, which yield planned scenarios by pages instead of whole list and know time of nearest planned run
+    (later than given time, if any)
+    """
+
+    def iter_planned(self, before: datetime, batch_size: int) -> AsyncIterator[List[ScenarioId]]:
+        ...
+
+    async def next_planned(self, after: Optional[datetime] = None) -> Optional[datetime]:
+        ...
+
+
+class ScenarioObserver(Protocol):
+    """
+    Receiver of scenario run timings. Phase is one of read, write, handler, enter, exit, schedule.
+    State, event type and handler name are None, where they are not known (e.g. batch read)
+    """
+
+    def observe(self, scenario: str, phase: str, duration: float, state: Optional[str],
+                event_type: Optional[str], handler: Optional[str]) -> None:
+        ...
+
+    def transition(self, scenario: str, prior_state: str, state: str) -> None:
+        ...
@@ -0,0 +1,75 @@
+from importlib import import_module, metadata
+from typing import Dict, Optional
+
+from .model import ScenarioError, ScenarioTaskName
+
+EntryPointGroup = 'ltsched.scenarios'
+
+
+def class_path(cls: type) -> str:
+    return f'{cls.__module__}:{cls.__qualname__}'
+
+
+class ScenarioRegistry:
+    """
+    Scenario classes by name. Concrete scenario classes are registered by ScenarioMeta on creation,
+    classes from not imported modules may be registered lazily by dotted path 'module:Class'
+    and imported on first lookup. Name may be registered again only by class of same path, e.g. on module reload
+    """
+
+    def __init__(self):
+        self.classes: Dict[str, type] = {}
+        self.by_task: Dict[str, type] = {}
+        self.lazy: Dict[str, str] = {}
+
+    def register(self, cls: type) -> None:
+        registered = self.classes.get(cls.name)
+        if registered is not None and class_path(registered) != class_path(cls):
+            raise ScenarioError(f'Scenario name {cls.name} of {class_path(cls)} '
+                                f'is already taken by {class_path(registered)}')
+        self.classes[cls.name] = cls
+        self.by_task[ScenarioTaskName % cls.name] = cls
+        self.lazy.pop(cls.name, None)
+
+    def register_lazy(self, name: str, path: str) -> None:
+        if name not in self.classes:
+            self.lazy[name] = path
+
+    def load_entry_points(self, group: str = EntryPointGroup) -> None:
+        """
+        Register lazily scenarios from entry points, where entry point name is scenario name
+        """
+        entry_points = metadata.entry_points()
+        group_points = entry_points.select(group=group) if hasattr(entry_points, 'select') \
+            else entry_points.get(group, ())
+        for entry_point in group_points:
+            self.register_lazy(entry_point.name, entry_point.value)
+
+    def get(self, name: str) -> type:
+        cls = self.classes.get(name)
+        if cls is None:
+            cls = self.load(name)
+        return cls
+
+    def get_by_task(self, task_name: str) -> type:
+        cls = self.by_task.get(task_name)
+        if cls is None:
+            prefix, _, suffix = ScenarioTaskName.partition('%s')
+            if not task_name.startswith(prefix) or not task_name.endswith(suffix):
+                raise ScenarioError(f'Task {task_name} is not scenario run')
+            cls = self.load(task_name[len(prefix):len(task_name) - len(suffix)])
+        return cls
+
+    def load(self, name: str) -> type:
+        path: Optional[str] = self.lazy.get(name)
+        if path is None:
+            raise ScenarioError(f'Scenario {name} not registered')
+        # scenario class is registered by ScenarioMeta on import of its module
+        import_module(path.partition(':')[0])
+        cls = self.classes.get(name)
+        if cls is None:
+            raise ScenarioError(f'Scenario {name} not found in {path}')
+        return cls
+
+
+scenario_registry = ScenarioRegistry()
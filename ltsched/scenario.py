@@ -1,14 +1,26 @@
 import abc
+import asyncio
 from collections import defaultdict
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from copy import deepcopy
+from contextvars import ContextVar, copy_context
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 from enum import Enum
 from functools import partial
-from inspect import isawaitable
+from inspect import isabstract, isawaitable, isfunction
 from itertools import chain
-from typing import Awaitable, Callable, ClassVar, Dict, FrozenSet, Iterable, List, Literal, Optional, Tuple, Union
+from time import perf_counter
+from types import MappingProxyType
+from typing import (Any, Awaitable, Callable, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Literal, Mapping,
+                    Optional, Tuple, Union)
 
-from .model import ScenarioError, ScenarioEvent, ScenarioExecutionStatus, ScenarioTaskName, ScenarioWarning
-from .protocols import ScenarioId, ScenarioStore, ScenarioStoreRepo, TaskScheduler, TimePoint
+from .model import (ScenarioError, ScenarioEvent, ScenarioExecutionStatus, ScenarioHandlersError, ScenarioTaskName,
+                    ScenarioWarning)
+from .protocols import (ScenarioId, ScenarioObserver, ScenarioStore, ScenarioStoreRepo, ScheduleRequest, TaskScheduler,
+                        TimePoint)
+from .registry import scenario_registry
 
 
 @dataclass
@@ -22,11 +34,20 @@ EventHandler = Callable[[ScenarioEvent], Union[HandlerResult, Awaitable[HandlerR
 TransitionHandler = Callable[[], None]
 
 
+class HandlerExecution(Enum):
+    Inline = 'inline'  # call in event loop
+    Thread = 'thread'  # call in thread executor, with context of run
+    Process = 'process'  # call handler(store, event) or handler(store) in process executor, without scenario
+
+
 @dataclass
 class EventHandlerDescriptor:
     events: Tuple[str]
     in_state: Tuple[str]
     out_state: Union[Literal['*'], FrozenSet[str]]
+    execution: Optional[HandlerExecution] = None  # None for scenario default
+    timeout: Optional[float] = None
+    method: bool = False  # declared in scenario class body, so called bound to scenario instance
 
 
 TransitionState = Union[str, Iterable[str], Enum, Iterable[Enum]]
@@ -47,7 +68,9 @@ def to_str_list(value: Iterable[Union[str, Enum]]) -> List[str]:
 
 
 def event_handler(events: Union[str, Enum, Iterable[str], Iterable[Enum]],
-                  transitions: Iterable[Transition]) -> Callable[[EventHandler], EventHandler]:
+                  transitions: Iterable[Transition],
+                  execution: Optional[HandlerExecution] = None,
+                  timeout: Optional[float] = None) -> Callable[[EventHandler], EventHandler]:
     def inner(method: EventHandler) -> EventHandler:
         in_state = set()
         out_state = set()
@@ -57,7 +80,9 @@ def event_handler(events: Union[str, Enum, Iterable[str], Iterable[Enum]],
             out_state |= set(to_str_list(transition[1]))
         method.__events__ = EventHandlerDescriptor(events=tuple(to_str_list(events)),
                                                    in_state=('*',) if '*' in in_state else tuple(in_state),
-                                                   out_state='*' if '*' in out_state else frozenset(out_state))
+                                                   out_state='*' if '*' in out_state else frozenset(out_state),
+                                                   execution=execution,
+                                                   timeout=timeout)
         return method
 
     return inner
@@ -67,12 +92,21 @@ def event_handler(events: Union[str, Enum, Iterable[str], Iterable[Enum]],
 class TransitionHandlerDescriptor:
     states: Tuple[str]
     on_exit: bool
+    execution: Optional[HandlerExecution] = None  # None for scenario default
+    timeout: Optional[float] = None
+    independent: bool = False  # may run concurrently with adjacent independent handlers
+    method: bool = False  # declared in scenario class body, so called bound to scenario instance
 
 
-def _on_transition(state: TransitionState, run_on_exit: bool) -> Callable[[TransitionHandler], TransitionHandler]:
+def _on_transition(state: TransitionState, run_on_exit: bool,
+                   execution: Optional[HandlerExecution] = None,
+                   timeout: Optional[float] = None,
+                   independent: bool = False) -> Callable[[TransitionHandler], TransitionHandler]:
     def inner(method: TransitionHandler) -> TransitionHandler:
         states = set(chain(to_str_list(state)))
-        method.__transitions__ = TransitionHandlerDescriptor(states=tuple(states), on_exit=run_on_exit)
+        method.__transitions__ = TransitionHandlerDescriptor(states=tuple(states), on_exit=run_on_exit,
+                                                             execution=execution, timeout=timeout,
+                                                             independent=independent)
         return method
 
     return inner
@@ -82,6 +116,18 @@ on_enter = partial(_on_transition, run_on_exit=False)
 on_exit = partial(_on_transition, run_on_exit=True)
 EventHandlersRegistry = Dict[str, Dict[str, EventHandler]]
 TransitionHandlersRegistry = Dict[str, List[TransitionHandler]]
+EventDispatchTable = Mapping[Tuple[str, str], Optional[EventHandler]]  # {(state, event): handler}
+# {(state, on_exit): (handlers group run concurrently, ...)}
+TransitionDispatchTable = Mapping[Tuple[str, bool], Tuple[Tuple[TransitionHandler, ...], ...]]
+
+
+def bind_handler(handler: Callable, descr: Union[EventHandlerDescriptor, TransitionHandlerDescriptor],
+                 instance: object) -> Callable:
+    """
+    Bind handler declared in scenario class body as method of scenario instance. Handlers added by
+    add_event_handler and others are called as is
+    """
+    return handler.__get__(instance, type(instance)) if descr.method else handler
 
 
 def register_event_handler(registry: EventHandlersRegistry, handler: EventHandler) -> None:
@@ -91,6 +137,155 @@ def register_event_handler(registry: EventHandlersRegistry, handler: EventHandle
             registry[state][event_type] = handler
 
 
+def compile_event_dispatch(registry: EventHandlersRegistry) -> EventDispatchTable:
+    """
+    Resolve '*' states and events of registry into flat table, so handler lookup is one or two dict accesses.
+    Every state with own handlers (and '*' for other ones) has its events and '*' row for unknown events,
+    see Scenario.get_event_handler
+    """
+    table = {}
+    for state in set(registry) | {'*'}:
+        state_events = registry.get(state)
+        if not state_events:
+            continue
+        for event_type, handler in state_events.items():
+            table[(state, event_type)] = handler
+        table.setdefault((state, '*'), None)
+    table.setdefault(('*', '*'), None)
+    return MappingProxyType(table)
+
+
+def compile_transition_dispatch(registry: TransitionHandlersRegistry) -> TransitionDispatchTable:
+    """
+    Resolve '*' state of registry into flat table of ready to run handlers for enter to and exit from state.
+    Unknown states run handlers of '*' key. Handlers are split to groups, which run one after another:
+    adjacent independent handlers make one group, other handlers are alone in group
+    """
+    common = registry.get('*', [])
+    table = {}
+    for state in set(registry) | {'*'}:
+        handlers = registry.get(state, []) + common if state != '*' else common
+        for run_on_exit in (False, True):
+            groups = []
+            for handler in handlers:
+                descr: TransitionHandlerDescriptor = handler.__transitions__
+                if descr.on_exit != run_on_exit:
+                    continue
+                if descr.independent and groups and groups[-1][0].__transitions__.independent:
+                    groups[-1].append(handler)
+                else:
+                    groups.append([handler])
+            table[(state, run_on_exit)] = tuple(tuple(it) for it in groups)
+    return MappingProxyType(table)
+
+
+@dataclass(frozen=True)
+class ScenarioGraph:
+    """
+    Transition graph of scenario. Every state is one bit in order of states, so set of states is int bitmask.
+    Edges keep '*' of handlers registered for any state or returning any state
+    """
+    states: Tuple[str, ...]
+    bits: Mapping[str, int]  # {state: bit}
+    edges: Tuple[Tuple[str, str, str], ...]  # (in state, event, out state)
+    out_masks: Mapping[EventHandler, Optional[int]]  # {handler: allowed out states}, None for any state
+    reachable: int  # states reachable from start state
+    live: int  # states, from which end state is reachable
+
+    def names(self, mask: int) -> FrozenSet[str]:
+        return frozenset(it for it in self.states if mask & self.bits[it])
+
+    @property
+    def unreachable(self) -> FrozenSet[str]:
+        return self.names(~self.reachable)
+
+    @property
+    def dead_ends(self) -> FrozenSet[str]:
+        return self.names(~self.live)
+
+    def to_dot(self, name: str = 'scenario') -> str:
+        lines = [f'digraph "{name}" {{']
+        lines.extend(f'  "{it}";' for it in self.states)
+        lines.extend(f'  "{s}" -> "{t}" [label="{e}"];' for s, e, t in self.edges)
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+def compile_graph(registry: EventHandlersRegistry, transitions: TransitionHandlersRegistry,
+                  start_state: Optional[str], end_states: Iterable[str]) -> ScenarioGraph:
+    """
+    Number states of scenario and find states, which are not reachable from start state or never reach end state.
+    State without own handlers follow handlers of '*' state, as in compile_event_dispatch
+    """
+    handlers = {it for state_events in registry.values() for it in state_events.values()}
+    states = set(registry) | set(transitions) | set(end_states)
+    if start_state:
+        states.add(start_state)
+    for handler in handlers:
+        if handler.__events__.out_state != '*':
+            states |= handler.__events__.out_state
+    states.discard('*')
+    states = tuple(sorted(states))
+    bits = {it: 1 << i for i, it in enumerate(states)}
+    any_state = (1 << len(states)) - 1
+    out_masks = {it: None if it.__events__.out_state == '*' else sum(bits[s] for s in it.__events__.out_state)
+                 for it in handlers}
+    end_mask = sum(bits[it] for it in end_states)
+    successors = {}
+    for state in states:
+        state_events = registry.get(state) or registry.get('*') or {}
+        mask = 0
+        if not bits[state] & end_mask:
+            for handler in state_events.values():
+                mask |= any_state if out_masks[handler] is None else out_masks[handler]
+        successors[state] = mask
+    reachable = any_state
+    if start_state:
+        reachable = front = bits[start_state]
+        while front:
+            next_front = 0
+            for state in states:
+                if front & bits[state]:
+                    next_front |= successors[state]
+            front = next_front & ~reachable
+            reachable |= front
+    live = end_mask if end_mask else any_state
+    changed = True
+    while changed:
+        changed = False
+        for state in states:
+            if successors[state] & live and not live & bits[state]:
+                live |= bits[state]
+                changed = True
+    edges = sorted({(state, event_type, out_state) for state, state_events in registry.items()
+                    for event_type, handler in state_events.items()
+                    for out_state in (handler.__events__.out_state if out_masks[handler] is not None else ('*',))})
+    return ScenarioGraph(states=states, bits=MappingProxyType(bits), edges=tuple(edges),
+                         out_masks=MappingProxyType(out_masks), reachable=reachable, live=live)
+
+
+class RunContext:
+    """
+    Data of one scenario run. Scenario instance keep it in context variable, so one instance can serve
+    many concurrent runs
+    """
+    __slots__ = ('scenario_id', 'store', 'event', 'result')
+
+    def __init__(self, scenario_id: ScenarioId, store: Optional[ScenarioStore] = None,
+                 event: Optional[ScenarioEvent] = None):
+        self.scenario_id = scenario_id
+        self.store = store
+        self.event = event
+        self.result: Optional[HandlerResult] = None
+
+
+_run_context: ContextVar[Optional[RunContext]] = ContextVar('ltsched_run_context', default=None)
+
+
+def current_run_context() -> Optional[RunContext]:
+    return _run_context.get()
+
+
 class ScenarioMeta(abc.ABCMeta):
 
     def __new__(mcs, name, bases, namespace, **kwargs):
@@ -100,18 +295,34 @@ class ScenarioMeta(abc.ABCMeta):
         for base in bases:
             base_event_handlers = getattr(base, 'event_handlers', None)
             if base_event_handlers:
-                event_handlers |= base_event_handlers
+                event_handlers |= {k: dict(v) for k, v in base_event_handlers.items()}
             base_transition_handlers = getattr(base, 'transition_handlers', None)
             if base_transition_handlers:
                 transition_handlers |= {k: {it.__name__: it for it in v}
                                         for k, v in base_transition_handlers.items()}
         for attr in cls.__dict__.values():
+            if isinstance(attr, staticmethod):
+                # descriptors of function decorated before staticmethod
+                for key in ('__events__', '__transitions__'):
+                    if not hasattr(attr, key) and hasattr(attr.__func__, key):
+                        setattr(attr, key, getattr(attr.__func__, key))
             if hasattr(attr, '__events__'):
+                cls.check_process_handler(attr, attr.__events__, True)
+                attr.__events__.method = True
                 register_event_handler(event_handlers, attr)
             if hasattr(attr, '__transitions__'):
+                cls.check_process_handler(attr, attr.__transitions__, True)
+                attr.__transitions__.method = True
                 mcs.register_transition_handler(transition_handlers, attr)
         cls.event_handlers = event_handlers
         cls.transition_handlers = {k: list(v.values()) for k, v in transition_handlers.items()}
+        cls.event_dispatch = compile_event_dispatch(cls.event_handlers)
+        cls.transition_dispatch = compile_transition_dispatch(cls.transition_handlers)
+        cls.compile_graph()
+        if cls.validate_graph:
+            cls.check_graph()
+        if 'name' in namespace and not isabstract(cls):
+            scenario_registry.register(cls)
         return cls
 
     @staticmethod
@@ -128,73 +339,282 @@ class Scenario(metaclass=ScenarioMeta):
     end_states: ClassVar[FrozenSet[str]]
     event_handlers: ClassVar[EventHandlersRegistry]  # {state: {event: handler}}
     transition_handlers: ClassVar[TransitionHandlersRegistry]  # {state: [handler]}
-    store: Optional[ScenarioStore]
-    scenario_id: Optional[ScenarioId]
-
-    def __init__(self, scheduler: TaskScheduler, store_repo: ScenarioStoreRepo):
+    event_dispatch: ClassVar[EventDispatchTable]
+    transition_dispatch: ClassVar[TransitionDispatchTable]
+    run_to_completion: ClassVar[bool] = False  # handle immediate next event in same run, without scheduler
+    max_chain_depth: ClassVar[int] = 32  # limit of immediate events handled in one run
+    plan_in_store: ClassVar[bool] = False  # keep next event in store for run_planned, instead of scheduler
+    handler_execution: ClassVar[HandlerExecution] = HandlerExecution.Inline  # default for sync handlers
+    handler_timeout: ClassVar[Optional[float]] = None  # default timeout of handlers in seconds
+    graph: ClassVar[ScenarioGraph]
+    validate_graph: ClassVar[bool] = False  # fail class creation on unreachable and dead end states
+
+    def __init__(self, scheduler: TaskScheduler, store_repo: ScenarioStoreRepo,
+                 clock: Callable[[], datetime] = datetime.now,
+                 executors: Optional[Mapping[HandlerExecution, Executor]] = None,
+                 observer: Optional[ScenarioObserver] = None):
         self.scheduler = scheduler
         self.store_repo = store_repo
-        self.store = None
-        self.scenario_id = None
+        self.clock = clock
+        self.executors = executors or {}
+        self.observer = observer
+
+    @property
+    def context(self) -> Optional[RunContext]:
+        return _run_context.get()
+
+    @property
+    def scenario_id(self) -> Optional[ScenarioId]:
+        context = _run_context.get()
+        return context.scenario_id if context else None
+
+    @property
+    def store(self) -> Optional[ScenarioStore]:
+        context = _run_context.get()
+        return context.store if context else None
+
+    @store.setter
+    def store(self, value: ScenarioStore) -> None:
+        context = _run_context.get()
+        if not context:
+            raise ScenarioError(f'Store of {self} set outside of run')
+        context.store = value
+
+    @property
+    def event(self) -> Optional[ScenarioEvent]:
+        context = _run_context.get()
+        return context.event if context else None
+
+    @contextmanager
+    def use_context(self, context: RunContext) -> Iterator[RunContext]:
+        token = _run_context.set(context)
+        try:
+            yield context
+        finally:
+            _run_context.reset(token)
 
     @classmethod
     def add_event_handler(cls, events: Union[str, Enum, Iterable[str], Iterable[Enum]],
                           transitions: Iterable[Transition],
-                          handler: EventHandler) -> None:
-        prepared_handler = event_handler(events, transitions)(handler)
+                          handler: EventHandler,
+                          execution: Optional[HandlerExecution] = None,
+                          timeout: Optional[float] = None) -> None:
+        prepared_handler = event_handler(events, transitions, execution, timeout)(handler)
+        cls.check_process_handler(prepared_handler, prepared_handler.__events__)
         register_event_handler(cls.event_handlers, prepared_handler)
+        cls.event_dispatch = compile_event_dispatch(cls.event_handlers)
+        cls.compile_graph()
+
+    @classmethod
+    def check_process_handler(cls, handler: Callable, descr: Union[EventHandlerDescriptor, TransitionHandlerDescriptor],
+                              declared: bool = False) -> None:
+        """
+        Handler run in process is pickled by reference and called without scenario instance, so it must be
+        staticmethod, when declared in class body, or module level function
+        """
+        if (descr.execution or cls.handler_execution) != HandlerExecution.Process:
+            return
+        func = handler.__func__ if isinstance(handler, staticmethod) else handler
+        if (declared and not isinstance(handler, staticmethod)) or not isfunction(func) or '<' in func.__qualname__:
+            raise ScenarioError(f'Handler {getattr(func, "__qualname__", func)} of {cls.__name__} run in process '
+                                f'must be staticmethod or module level function')
 
     @classmethod
     def _register_transition_handler(cls, handler: TransitionHandler):
         handler_descr: TransitionHandlerDescriptor = getattr(handler, '__transitions__')
+        cls.check_process_handler(handler, handler_descr)
         for state in handler_descr.states:
             handlers = cls.transition_handlers.setdefault(state, [])
             handlers.append(handler)
+        cls.transition_dispatch = compile_transition_dispatch(cls.transition_handlers)
+        cls.compile_graph()
+
+    @classmethod
+    def compile_graph(cls) -> None:
+        start_state = getattr(cls, 'start_state', None)
+        cls.graph = compile_graph(cls.event_handlers, cls.transition_handlers,
+                                  to_str(start_state) if start_state else None,
+                                  to_str_list(getattr(cls, 'end_states', ())))
+
+    @classmethod
+    def check_graph(cls) -> None:
+        """
+        Raise ScenarioError, if some states are not reachable from start state or never reach end state
+        """
+        unreachable, dead_ends = cls.graph.unreachable, cls.graph.dead_ends
+        if unreachable or dead_ends:
+            raise ScenarioError(f'Scenario {cls.__name__} has unreachable states {sorted(unreachable)} '
+                                f'and states without way to end {sorted(dead_ends)}')
 
     @classmethod
-    def add_enter_handler(cls, state: TransitionState, handler: TransitionHandler) -> None:
-        prepared_handler = _on_transition(state, run_on_exit=False)(handler)
+    def add_enter_handler(cls, state: TransitionState, handler: TransitionHandler,
+                          execution: Optional[HandlerExecution] = None, timeout: Optional[float] = None,
+                          independent: bool = False) -> None:
+        prepared_handler = _on_transition(state, False, execution, timeout, independent)(handler)
         cls._register_transition_handler(prepared_handler)
 
     @classmethod
-    def add_exit_handler(cls, state: TransitionState, handler: TransitionHandler) -> None:
-        prepared_handler = _on_transition(state, run_on_exit=True)(handler)
+    def add_exit_handler(cls, state: TransitionState, handler: TransitionHandler,
+                         execution: Optional[HandlerExecution] = None, timeout: Optional[float] = None,
+                         independent: bool = False) -> None:
+        prepared_handler = _on_transition(state, True, execution, timeout, independent)(handler)
         cls._register_transition_handler(prepared_handler)
 
     def __str__(self):
         return f'{self.__class__.name}({self.name}):{self.scenario_id}'
 
+    def observe(self, phase: str, started: float, handler: Optional[Callable] = None) -> None:
+        duration = perf_counter() - started
+        context = _run_context.get()
+        store = context.store if context else None
+        event = context.event if context else None
+        self.observer.observe(self.name, phase, duration, store.state if store else None,
+                              event if event is None or isinstance(event, str) else to_str(event.type),
+                              getattr(handler, '__name__', None) if handler else None)
+
     async def read_store(self) -> None:
+        started = perf_counter() if self.observer else 0
         self.store = await self.store_repo.read_store(self.scenario_id)
+        if self.observer:
+            self.observe('read', started)
         if not self.store:
             raise ScenarioError(f'Stored data for {self} not found')
 
     async def write_store(self) -> None:
+        started = perf_counter() if self.observer else 0
         await self.store_repo.write_store(self.scenario_id, self.store)
+        if self.observer:
+            self.observe('write', started)
+
+    async def read_stores(self, identities: Iterable[ScenarioId]) -> Mapping[ScenarioId, Optional[ScenarioStore]]:
+        started = perf_counter() if self.observer else 0
+        identities = list(dict.fromkeys(identities))
+        bulk_read = getattr(self.store_repo, 'read_stores', None)
+        if bulk_read:
+            stores = await bulk_read(identities)
+        else:
+            stores = dict(zip(identities, await asyncio.gather(*(self.store_repo.read_store(it) for it in identities))))
+        if self.observer:
+            self.observe('read', started)
+        return stores
+
+    async def write_stores(self, stores: Mapping[ScenarioId, ScenarioStore]) -> None:
+        if not stores:
+            return
+        started = perf_counter() if self.observer else 0
+        bulk_write = getattr(self.store_repo, 'write_stores', None)
+        if bulk_write:
+            await bulk_write(stores)
+        else:
+            await asyncio.gather(*(self.store_repo.write_store(k, v) for k, v in stores.items()))
+        if self.observer:
+            self.observe('write', started)
 
     def get_event_handler(self, event: ScenarioEvent) -> Optional[EventHandler]:
         event_type = event if isinstance(event, str) else event.type
-        state_events = self.event_handlers.get(self.store.state)
-        if not state_events:
-            state_events = self.event_handlers.get('*')
-        if state_events:
-            handler = state_events.get(event_type)
-            if not handler:
-                handler = state_events.get('*')
-            return handler
+        state = self.store.state
+        try:
+            return self.event_dispatch[(state, event_type)]
+        except KeyError:
+            pass
+        if (state, '*') not in self.event_dispatch:
+            state = '*'
+        return self.event_dispatch.get((state, event_type), self.event_dispatch[(state, '*')])
 
     async def run(self, scenario_id: ScenarioId, event: ScenarioEvent):
-        self.scenario_id = scenario_id
-        await self.read_store()
-        if self.store.exec_state != ScenarioExecutionStatus.Run:
-            return
+        with self.use_context(RunContext(scenario_id, event=event)):
+            await self.read_store()
+            if self.store.exec_state != ScenarioExecutionStatus.Run:
+                return
+            result = await self.process_event(event)
+            await self.write_store()
+            await self.schedule_next_run(result)
+
+    async def run_planned(self, scenario_id: ScenarioId):
+        """
+        Run event planned in store, if its time has come
+        """
+        with self.use_context(RunContext(scenario_id)) as context:
+            await self.read_store()
+            store = self.store
+            if (store.exec_state != ScenarioExecutionStatus.Run or store.next_event is None
+                    or store.next_run is None or store.next_run > self.clock()):
+                return
+            context.event = store.next_event
+            store.next_run = store.next_event = None
+            result = await self.process_event(context.event)
+            await self.write_store()
+            await self.schedule_next_run(result)
+
+    async def run_batch(self, items: Iterable[Tuple[ScenarioId, ScenarioEvent]]) -> List[Optional[Exception]]:
+        """
+        Run events for many scenarios with one read and one write of all stores.
+        Return error of each item or None, failed items not break batch
+        """
+        items = list(items)
+        stores = dict(await self.read_stores(it[0] for it in items))
+        errors: List[Optional[Exception]] = []
+        changed: Dict[ScenarioId, ScenarioStore] = {}
+        planned: List[Tuple[RunContext, HandlerResult]] = []
+        for scenario_id, event in items:
+            store = stores.get(scenario_id)
+            # every item runs on own copy, so failed item does not leave changes in store of scenario
+            context = RunContext(scenario_id, deepcopy(store) if store else None, event)
+            with self.use_context(context):
+                try:
+                    if not context.store:
+                        raise ScenarioError(f'Stored data for {self} not found')
+                    if context.store.exec_state == ScenarioExecutionStatus.Run:
+                        planned.append((context, await self.process_event(event)))
+                        changed[scenario_id] = stores[scenario_id] = context.store
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+        await self.write_stores(changed)
+        requests = []
+        for context, result in planned:
+            with self.use_context(context):
+                request = self.get_schedule_request(result)
+            if request:
+                requests.append(request)
+        await self.schedule_many(requests)
+        return errors
+
+    async def process_event(self, event: ScenarioEvent) -> HandlerResult:
+        """
+        Handle event, and when run_to_completion is set, handle immediate next events in loop up to max_chain_depth.
+        Next event of last result is left for scheduler or planned in store
+        """
+        result = await self.handle_event(event)
+        if self.run_to_completion:
+            depth = 0
+            while (result.next_event and depth < self.max_chain_depth
+                   and self.store.exec_state == ScenarioExecutionStatus.Run
+                   and (result.next_run is None or result.next_run == timedelta())):
+                depth += 1
+                self.context.event = result.next_event
+                result = await self.handle_event(result.next_event)
+        if self.plan_in_store and result.next_event and self.store.exec_state == ScenarioExecutionStatus.Run:
+            self.store.next_run = self.get_run_time(result.next_run)
+            self.store.next_event = result.next_event
+        self.context.result = result
+        return result
+
+    def get_run_time(self, point: TimePoint) -> datetime:
+        if point is None:
+            return self.clock()
+        elif isinstance(point, timedelta):
+            return self.clock() + point
+        return point
+
+    async def handle_event(self, event: ScenarioEvent) -> HandlerResult:
         prior_state = self.store.state
         handler = self.get_event_handler(event)
         if handler:
-            result_or_awaitable = handler(event)
-            result: HandlerResult = await result_or_awaitable \
-                if isawaitable(result_or_awaitable) else result_or_awaitable
+            result: HandlerResult = await self.call_handler(handler, handler.__events__, event)
             self.check_new_state(handler, result.state)
+            if self.observer:
+                self.observer.transition(self.name, prior_state, result.state)
             if result.state != prior_state:
                 await self.run_transition_handlers(prior_state, True)
             self.store.state = result.state
@@ -202,35 +622,94 @@ class Scenario(metaclass=ScenarioMeta):
                 await self.run_transition_handlers(result.state, False)
             if result.state in self.end_states:
                 self.store.exec_state = ScenarioExecutionStatus.Finished
-            await self.write_store()
-            await self.schedule_next_run(result)
+            return result
         else:
             raise ScenarioWarning(f'Not found handler for event %s in scenario %s', event, self.name)
 
+    def get_schedule_request(self, result: HandlerResult) -> Optional[ScheduleRequest]:
+        if self.plan_in_store or self.store.exec_state != ScenarioExecutionStatus.Run or not result.next_event:
+            return None
+        task_name = ScenarioTaskName % self.name
+        return ScheduleRequest(result.next_run, task_name, (self.scenario_id, result.next_event),
+                               task_id=f'{task_name}:{self.scenario_id}', force=True)
+
     async def schedule_next_run(self, result: HandlerResult):
-        if self.store.exec_state == ScenarioExecutionStatus.Run:
+        request = self.get_schedule_request(result)
+        if request:
+            started = perf_counter() if self.observer else 0
+            await self.scheduler.schedule(request.point, request.task_name, *request.args,
+                                          task_id=request.task_id, force=request.force)
+            if self.observer:
+                self.observe('schedule', started)
+
+    async def schedule_many(self, requests: List[ScheduleRequest]) -> None:
+        if not requests:
             return
-        elif result.next_event:
-            task_name = ScenarioTaskName % self.name
-            await self.scheduler.schedule(result.next_run,
-                                          task_name,
-                                          self.scenario_id,
-                                          result.next_event,
-                                          task_id=f'{task_name}:{self.scenario_id}',
-                                          force=True)
+        started = perf_counter() if self.observer else 0
+        bulk_schedule = getattr(self.scheduler, 'schedule_many', None)
+        if bulk_schedule:
+            await bulk_schedule(requests)
+        else:
+            for it in requests:
+                await self.scheduler.schedule(it.point, it.task_name, *it.args, task_id=it.task_id, force=it.force)
+        if self.observer:
+            self.observe('schedule', started)
 
     def check_new_state(self, handler: EventHandler, state: str) -> None:
-        # noinspection PyUnresolvedReferences
-        descr: EventHandlerDescriptor = handler.__events__
-        if descr.out_state != '*' and state not in descr.out_state:
+        allowed = self.graph.out_masks.get(handler)
+        if allowed is not None and not allowed & self.graph.bits.get(state, 0):
             raise ScenarioWarning(f'Event handler {handler.__name__} in {self} return not allowed state "{state}"')
 
     async def run_transition_handlers(self, state: str, run_on_exit: bool):
-        handlers = self.transition_handlers.get(state, [])
-        handlers.extend(self.transition_handlers.get('*', []))
-        for handler in handlers:
-            descr: TransitionHandlerDescriptor = handler.__transitions__
-            if descr.on_exit == run_on_exit:
-                result_or_awaitable = handler()
-                if isawaitable(result_or_awaitable):
-                    await result_or_awaitable
+        groups = self.transition_dispatch.get((state, run_on_exit))
+        if groups is None:
+            groups = self.transition_dispatch[('*', run_on_exit)]
+        for group in groups:
+            if len(group) == 1:
+                await self.call_handler(group[0], group[0].__transitions__)
+                continue
+            results = await asyncio.gather(*(self.call_handler(it, it.__transitions__) for it in group),
+                                           return_exceptions=True)
+            errors = [it for it in results if isinstance(it, BaseException)]
+            if len(errors) == 1:
+                raise errors[0]
+            elif errors:
+                raise ScenarioHandlersError(f'Transition handlers of state {state} in {self} failed', errors)
+
+    async def call_handler(self, handler: Callable,
+                           descr: Union[EventHandlerDescriptor, TransitionHandlerDescriptor], *args) -> Any:
+        if not self.observer:
+            return await self.execute_handler(handler, descr, *args)
+        started = perf_counter()
+        try:
+            return await self.execute_handler(handler, descr, *args)
+        finally:
+            self.observe('handler' if isinstance(descr, EventHandlerDescriptor) else 'exit' if descr.on_exit
+                         else 'enter', started, handler)
+
+    async def execute_handler(self, handler: Callable,
+                              descr: Union[EventHandlerDescriptor, TransitionHandlerDescriptor], *args) -> Any:
+        """
+        Call handler according to its execution policy and timeout, or to scenario defaults
+        """
+        execution = descr.execution or self.handler_execution
+        timeout = descr.timeout if descr.timeout is not None else self.handler_timeout
+        if execution == HandlerExecution.Inline:
+            result = bind_handler(handler, descr, self)(*args)
+            if not isawaitable(result):
+                return result
+        elif execution == HandlerExecution.Thread:
+            result = asyncio.get_running_loop().run_in_executor(
+                self.executors.get(HandlerExecution.Thread),
+                partial(copy_context().run, bind_handler(handler, descr, self), *args))
+        else:
+            executor = self.executors.get(HandlerExecution.Process)
+            if not executor:
+                raise ScenarioError(f'Process executor for handler {handler.__name__} in {self} not set')
+            result = asyncio.get_running_loop().run_in_executor(
+                executor, partial(bind_handler(handler, descr, self), self.store, *args))
+        try:
+            result = await asyncio.wait_for(result, timeout) if timeout else await result
+        except asyncio.TimeoutError:
+            raise ScenarioError(f'Handler {handler.__name__} in {self} timed out')
+        return await result if isawaitable(result) else result
@@ -0,0 +1,232 @@
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from .memory import MemoryScenarioStoreRepo
+from .model import ScenarioEvent, ScenarioId, ScenarioStore, ScenarioTaskName
+from .protocols import TimePoint
+from .scenario import Scenario, to_str
+
+logger = logging.getLogger(__name__)
+
+SimulatedTask = Tuple[datetime, int, str, Tuple, Optional[str]]  # (due, sequence, task name, args, task id)
+DUE_EPSILON = timedelta(microseconds=1)
+
+
+class VirtualClock:
+    """
+    Clock of simulation, which time is moved by simulator only
+    """
+
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class VirtualTimeScheduler:
+    """
+    Task scheduler on virtual clock. Tasks are kept in heap by due time, task replaced by id stays in heap
+    and is skipped on pop
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.queue: List[SimulatedTask] = []
+        self.tasks: Dict[str, SimulatedTask] = {}
+        self.sequence = count()
+        self.pending = 0
+
+    async def schedule(self, point: TimePoint, task_name: str, *args,
+                       task_id: Optional[str] = None, force: bool = False) -> None:
+        if task_id is not None and task_id in self.tasks:
+            if not force:
+                return
+            self.pending -= 1
+        if point is None:
+            point = self.clock.now
+        elif isinstance(point, timedelta):
+            point = self.clock.now + point
+        task = (max(point, self.clock.now), next(self.sequence), task_name, args, task_id)
+        if task_id is not None:
+            self.tasks[task_id] = task
+        heappush(self.queue, task)
+        self.pending += 1
+
+    def is_live(self, task: SimulatedTask) -> bool:
+        return task[4] is None or self.tasks.get(task[4]) is task
+
+    def next_due(self) -> Optional[datetime]:
+        while self.queue and not self.is_live(self.queue[0]):
+            heappop(self.queue)
+        return self.queue[0][0] if self.queue else None
+
+    def pop_due(self) -> List[SimulatedTask]:
+        """
+        Remove and return tasks due to the clock time in order of schedule
+        """
+        result = []
+        while self.queue and self.queue[0][0] <= self.clock.now:
+            task = heappop(self.queue)
+            if self.is_live(task):
+                if task[4] is not None:
+                    del self.tasks[task[4]]
+                self.pending -= 1
+                result.append(task)
+        return result
+
+
+@dataclass
+class SimulationReport:
+    started: datetime
+    finished: datetime
+    wall_time: float = 0
+    runs: int = 0
+    events: Counter = field(default_factory=Counter)  # {(scenario name, event type): count}
+    errors: Counter = field(default_factory=Counter)  # {(scenario name, error class name): count}
+    states: Counter = field(default_factory=Counter)  # {(scenario name, state): count} at finish
+    occupancy: Counter = field(default_factory=Counter)  # {(scenario name, state): scenario-seconds}
+    peak_pending: int = 0  # scheduled tasks and runs planned in stores
+
+    @property
+    def duration(self) -> float:
+        return (self.finished - self.started).total_seconds()
+
+    @property
+    def event_rate(self) -> float:
+        """
+        Events per simulated second
+        """
+        return self.runs / self.duration if self.duration else 0.0
+
+    @property
+    def run_rate(self) -> float:
+        """
+        Runs per wall clock second, i.e. speed of simulation
+        """
+        return self.runs / self.wall_time if self.wall_time else 0.0
+
+    def mean_occupancy(self) -> Dict[Tuple[str, str], float]:
+        """
+        Mean number of scenarios in state over simulated time
+        """
+        return {k: v / self.duration for k, v in self.occupancy.items()} if self.duration else {}
+
+
+class Simulation:
+    """
+    Discrete-event simulation of scenarios in virtual time. Every scenario class gets own memory repo,
+    and all share virtual time scheduler. Clock jumps to the time of next scheduled task or run planned in store,
+    so weeks of scenario life are simulated as fast as handlers run. Due tasks run one by one in order of schedule
+    """
+
+    def __init__(self, scenarios: Iterable[Type[Scenario]], start: datetime = datetime(2000, 1, 1)):
+        self.clock = VirtualClock(start)
+        self.scheduler = VirtualTimeScheduler(self.clock)
+        self.scenarios: Dict[str, Scenario] = {}
+        for scenario_class in scenarios:
+            scenario = scenario_class(self.scheduler, MemoryScenarioStoreRepo(), clock=self.clock)
+            self.scenarios[ScenarioTaskName % scenario.name] = scenario
+        self.report = SimulationReport(started=start, finished=start)
+        self.states: Dict[Tuple[str, ScenarioId], str] = {}
+
+    async def start(self, name: str, scenario_id: ScenarioId, store: ScenarioStore) -> None:
+        """
+        Write initial store of scenario
+        """
+        scenario = self.scenarios[ScenarioTaskName % name]
+        await scenario.store_repo.write_store(scenario_id, store)
+        self.track(scenario, scenario_id)
+
+    async def inject(self, point: TimePoint, name: str, scenario_id: ScenarioId, event: ScenarioEvent) -> None:
+        """
+        Schedule external event of scenario
+        """
+        await self.scheduler.schedule(point, ScenarioTaskName % name, scenario_id, event)
+
+    def track(self, scenario: Scenario, scenario_id: ScenarioId) -> None:
+        store = scenario.store_repo.stores.get(scenario_id)
+        key = (scenario.name, scenario_id)
+        prior_state = self.states.get(key)
+        state = store.state if store else None
+        if state == prior_state:
+            return
+        if prior_state is not None:
+            self.report.states[(scenario.name, prior_state)] -= 1
+            if not self.report.states[(scenario.name, prior_state)]:
+                del self.report.states[(scenario.name, prior_state)]
+        if state is None:
+            self.states.pop(key, None)
+        else:
+            self.states[key] = state
+            self.report.states[(scenario.name, state)] += 1
+
+    async def next_due(self) -> Optional[datetime]:
+        points = [await it.store_repo.next_planned() for it in self.scenarios.values()]
+        points.append(self.scheduler.next_due())
+        points = [it for it in points if it is not None]
+        return min(points) if points else None
+
+    def advance(self, point: datetime) -> None:
+        if point <= self.clock.now:
+            return
+        seconds = (point - self.clock.now).total_seconds()
+        for key, number in self.report.states.items():
+            self.report.occupancy[key] += number * seconds
+        self.clock.now = point
+
+    def count_pending(self) -> None:
+        pending = self.scheduler.pending + sum(len(it.store_repo.planned) for it in self.scenarios.values())
+        self.report.peak_pending = max(self.report.peak_pending, pending)
+
+    async def run(self, until: Optional[datetime] = None, max_runs: Optional[int] = None) -> SimulationReport:
+        """
+        Run due tasks until no one left, until time or number of runs
+        """
+        started = time.perf_counter()
+        report = self.report
+        while max_runs is None or report.runs < max_runs:
+            self.count_pending()
+            point = await self.next_due()
+            if point is None or (until is not None and point > until):
+                break
+            self.advance(point)
+            for _, _, task_name, args, _ in self.scheduler.pop_due():
+                scenario_id, event = args
+                await self.run_task(self.scenarios[task_name], scenario_id, event)
+            for scenario in self.scenarios.values():
+                for scenario_id in scenario.store_repo.pop_planned(self.clock.now + DUE_EPSILON):
+                    await self.run_task(scenario, scenario_id)
+        if until is not None:
+            self.advance(until)
+        report.finished = self.clock.now
+        report.wall_time += time.perf_counter() - started
+        return report
+
+    async def run_task(self, scenario: Scenario, scenario_id: ScenarioId,
+                       event: Optional[ScenarioEvent] = None) -> None:
+        """
+        Run event of scenario, or event planned in its store when event is None
+        """
+        planned = event is None
+        if planned:
+            store = scenario.store_repo.stores.get(scenario_id)
+            event = store.next_event if store else None
+        self.report.runs += 1
+        if event is not None:
+            self.report.events[(scenario.name, to_str(event if isinstance(event, str) else event.type))] += 1
+        try:
+            if planned:
+                await scenario.run_planned(scenario_id)
+            else:
+                await scenario.run(scenario_id, event)
+        except Exception as e:
+            logger.debug('Run of %s %s failed', scenario.name, scenario_id, exc_info=True)
+            self.report.errors[(scenario.name, type(e).__name__)] += 1
+        self.track(scenario, scenario_id)
@@ -0,0 +1,159 @@
+import asyncio
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple, Type
+
+from .model import BaseScenarioStore, ScenarioExecutionStatus, ScenarioId, ScenarioStore
+
+Row = Tuple[str, str, str, Optional[str], Optional[str], Optional[bytes], Optional[bytes]]
+
+BASE_FIELDS = frozenset(it.name for it in fields(BaseScenarioStore))
+MAX_QUERY_PARAMS = 500
+
+
+class SqliteScenarioStoreRepo:
+    """
+    Store repo in sqlite database file. Database is used in WAL mode from dedicated thread.
+    Writes made in one event loop tick are committed in one transaction.
+    Base store fields are kept in columns, next event is pickled and fields of store subclass are pickled as tuple
+    in data column.
+    Datetime of next run is kept in ISO format, so all stores must use either naive or same timezone datetime
+    """
+
+    def __init__(self, path: str, store_type: Type[ScenarioStore] = BaseScenarioStore,
+                 table: str = 'scenario_store'):
+        self.path = path
+        self.store_type = store_type
+        self.table = table
+        self.extra_fields = tuple(it.name for it in fields(store_type) if it.name not in BASE_FIELDS)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ltsched-sqlite')
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pending: Dict[ScenarioId, Row] = {}
+        self.flush_task: Optional[asyncio.Future] = None
+
+    async def execute(self, func, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                               f'id TEXT PRIMARY KEY, state TEXT NOT NULL, exec_state TEXT NOT NULL, '
+                               f'error TEXT, next_run TEXT, next_event BLOB, data BLOB)')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_planned '
+                               f'ON {self.table} (exec_state, next_run)')
+            self.connection = connection
+        return self.connection
+
+    def dump(self, identity: ScenarioId, store: ScenarioStore) -> Row:
+        data = pickle.dumps(tuple(getattr(store, it) for it in self.extra_fields), pickle.HIGHEST_PROTOCOL) \
+            if self.extra_fields else None
+        next_event = pickle.dumps(store.next_event, pickle.HIGHEST_PROTOCOL) if store.next_event is not None else None
+        return (identity, store.state, store.exec_state.value, store.error,
+                store.next_run.isoformat() if store.next_run else None, next_event, data)
+
+    def load(self, row: Row) -> ScenarioStore:
+        _, state, exec_state, error, next_run, next_event, data = row
+        extra = dict(zip(self.extra_fields, pickle.loads(data))) if data else {}
+        return self.store_type(state=state, exec_state=ScenarioExecutionStatus(exec_state), error=error,
+                               next_run=datetime.fromisoformat(next_run) if next_run else None,
+                               next_event=pickle.loads(next_event) if next_event is not None else None, **extra)
+
+    def select(self, identities: List[ScenarioId]) -> List[Row]:
+        connection = self.connect()
+        rows = []
+        for i in range(0, len(identities), MAX_QUERY_PARAMS):
+            chunk = identities[i:i + MAX_QUERY_PARAMS]
+            rows.extend(connection.execute(f'SELECT * FROM {self.table} WHERE id IN ({",".join("?" * len(chunk))})',
+                                           chunk))
+        return rows
+
+    def commit(self, rows: List[Row]) -> None:
+        connection = self.connect()
+        connection.execute('BEGIN')
+        try:
+            connection.executemany(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def select_planned(self, before: str) -> List[ScenarioId]:
+        return [it[0] for it in self.connect().execute(
+            f'SELECT id FROM {self.table} WHERE exec_state = ? AND next_run < ?',
+            (ScenarioExecutionStatus.Run.value, before))]
+
+    def select_planned_page(self, before: str, after: Tuple[str, str], limit: int) -> List[Tuple[str, str]]:
+        return list(self.connect().execute(
+            f'SELECT id, next_run FROM {self.table} WHERE exec_state = ? AND next_run < ? AND (next_run, id) > (?, ?) '
+            f'ORDER BY next_run, id LIMIT ?',
+            (ScenarioExecutionStatus.Run.value, before, *after, limit)))
+
+    def select_next_planned(self, after: Optional[str]) -> Optional[str]:
+        return self.connect().execute(f'SELECT MIN(next_run) FROM {self.table} WHERE exec_state = ? AND next_run > ?',
+                                      (ScenarioExecutionStatus.Run.value, after or '')).fetchone()[0]
+
+    async def read_store(self, identity: ScenarioId) -> Optional[ScenarioStore]:
+        stores = await self.read_stores((identity,))
+        return stores[identity]
+
+    async def read_stores(self, identities: Iterable[ScenarioId]) -> Mapping[ScenarioId, Optional[ScenarioStore]]:
+        result = {}
+        missed = []
+        for identity in identities:
+            row = self.pending.get(identity)
+            if row:
+                result[identity] = self.load(row)
+            else:
+                result[identity] = None
+                missed.append(identity)
+        if missed:
+            for row in await self.execute(self.select, missed):
+                result[row[0]] = self.load(row)
+        return result
+
+    async def write_store(self, identity: ScenarioId, store: ScenarioStore) -> None:
+        await self.write_stores({identity: store})
+
+    async def write_stores(self, stores: Mapping[ScenarioId, ScenarioStore]) -> None:
+        for identity, store in stores.items():
+            self.pending[identity] = self.dump(identity, store)
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush())
+        await asyncio.shield(self.flush_task)
+
+    async def flush(self) -> None:
+        rows = list(self.pending.values())
+        self.pending = {}
+        self.flush_task = None
+        if rows:
+            await self.execute(self.commit, rows)
+
+    async def search_planned(self, before: datetime) -> List[ScenarioId]:
+        return await self.execute(self.select_planned, before.isoformat())
+
+    async def iter_planned(self, before: datetime, batch_size: int) -> AsyncIterator[List[ScenarioId]]:
+        cursor = ('', '')
+        while True:
+            rows = await self.execute(self.select_planned_page, before.isoformat(), cursor, batch_size)
+            if not rows:
+                return
+            cursor = rows[-1][1], rows[-1][0]
+            yield [it[0] for it in rows]
+
+    async def next_planned(self, after: Optional[datetime] = None) -> Optional[datetime]:
+        next_run = await self.execute(self.select_next_planned, after.isoformat() if after else None)
+        return datetime.fromisoformat(next_run) if next_run else None
+
+    async def close(self) -> None:
+        if self.flush_task:
+            await self.flush_task
+        if self.connection:
+            await self.execute(self.connection.close)
+            self.connection = None
+        self.executor.shutdown()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from inspect import isawaitable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .protocols import ScheduleRequest, TimePoint
+
+logger = logging.getLogger(__name__)
+
+TaskHandler = Callable[..., Any]
+
+
+class WheelTask:
+    __slots__ = ('deadline', 'task_name', 'args', 'task_id', 'slot')
+
+    def __init__(self, deadline: int, task_name: str, args: Tuple, task_id: Optional[str]):
+        self.deadline = deadline
+        self.task_name = task_name
+        self.args = args
+        self.task_id = task_id
+        self.slot: Optional[Set['WheelTask']] = None
+
+
+class TimingWheelScheduler:
+    """
+    In-process task scheduler on hierarchical timing wheel. Time is measured in ticks, level of wheel covers
+    wheel_size slots of previous level. Schedule and cancel are O(1), tasks of expired slot are fired as batch.
+    Task is fired by call of handler(task_name, *args), awaitable results are awaited in background
+    """
+
+    def __init__(self, handler: TaskHandler, tick: float = 0.1, wheel_size: int = 256, levels: int = 4,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.handler = handler
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self.clock = clock
+        self.spans = [wheel_size ** it for it in range(levels + 1)]
+        self.wheels: List[List[Set[WheelTask]]] = [[set() for _ in range(wheel_size)] for _ in range(levels)]
+        self.tasks: Dict[str, WheelTask] = {}
+        self.current_tick = 0
+        self.size = 0
+        self.firing: Set[asyncio.Future] = set()
+
+    async def schedule(self, point: TimePoint, task_name: str, *args,
+                       task_id: Optional[str] = None, force: bool = False) -> None:
+        if task_id is not None and task_id in self.tasks:
+            if not force:
+                return
+            self.cancel(task_id)
+        task = WheelTask(self.current_tick + max(self.get_ticks(point), 1), task_name, args, task_id)
+        if task_id is not None:
+            self.tasks[task_id] = task
+        self.insert(task)
+        self.size += 1
+
+    async def schedule_many(self, requests: Iterable[ScheduleRequest]) -> None:
+        for it in requests:
+            await self.schedule(it.point, it.task_name, *it.args, task_id=it.task_id, force=it.force)
+
+    def cancel(self, task_id: str) -> bool:
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return False
+        task.slot.discard(task)
+        self.size -= 1
+        return True
+
+    def get_ticks(self, point: TimePoint) -> int:
+        if point is None:
+            return 0
+        if isinstance(point, datetime):
+            point = point - self.clock()
+        return math.ceil(point / timedelta(seconds=self.tick))
+
+    def insert(self, task: WheelTask) -> None:
+        delay = task.deadline - self.current_tick
+        for level in range(self.levels):
+            if delay < self.spans[level + 1]:
+                slot = (task.deadline // self.spans[level]) % self.wheel_size
+                break
+        else:
+            # beyond last level, wait in slot cascaded last and insert again
+            level = self.levels - 1
+            slot = (self.current_tick // self.spans[level] - 1) % self.wheel_size
+        task.slot = self.wheels[level][slot]
+        task.slot.add(task)
+
+    def advance(self, ticks: int = 1) -> List[WheelTask]:
+        """
+        Move wheel forward and return expired tasks
+        """
+        expired = []
+        for _ in range(ticks):
+            self.current_tick += 1
+            for level in range(1, self.levels):
+                if self.current_tick % self.spans[level]:
+                    break
+                self.cascade(level, (self.current_tick // self.spans[level]) % self.wheel_size)
+            slot = self.wheels[0][self.current_tick % self.wheel_size]
+            if slot:
+                expired.extend(slot)
+                slot.clear()
+        for task in expired:
+            if task.task_id is not None:
+                del self.tasks[task.task_id]
+        self.size -= len(expired)
+        return expired
+
+    def cascade(self, level: int, slot_index: int) -> None:
+        slot = self.wheels[level][slot_index]
+        tasks = list(slot)
+        slot.clear()
+        for task in tasks:
+            self.insert(task)
+
+    async def fire(self, tasks: List[WheelTask]) -> None:
+        running = []
+        for task in tasks:
+            try:
+                result = self.handler(task.task_name, *task.args)
+            except Exception:
+                logger.exception('Task %s failed', task.task_name)
+                continue
+            if isawaitable(result):
+                running.append((task, result))
+        results = await asyncio.gather(*(it[1] for it in running), return_exceptions=True)
+        for (task, _), result in zip(running, results):
+            if isinstance(result, Exception):
+                logger.error('Task %s failed', task.task_name, exc_info=result)
+
+    async def run(self) -> None:
+        started = time.monotonic()
+        start_tick = self.current_tick
+        while True:
+            await asyncio.sleep(self.tick)
+            target = start_tick + int((time.monotonic() - started) / self.tick)
+            if target > self.current_tick:
+                expired = self.advance(target - self.current_tick)
+                if expired:
+                    firing = asyncio.ensure_future(self.fire(expired))
+                    self.firing.add(firing)
+                    firing.add_done_callback(self.firing.discard)
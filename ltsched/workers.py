@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from queue import Full
+from functools import partial
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from .dispatcher import MailboxDispatcher
+from .model import ScenarioEvent, ScenarioId
+from .scenario import Scenario
+
+logger = logging.getLogger(__name__)
+
+RUN_EVENT, RUN_PLANNED = 'event', 'planned'
+Message = Tuple[str, str, ScenarioId, Optional[ScenarioEvent]]  # (kind, scenario name, scenario id, event)
+ScenariosFactory = Callable[[], Iterable[Scenario]]
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash, which move only 1/n keys when number of buckets grows to n
+    """
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xffffffffffffffff
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(scenario_id: ScenarioId, shards: int) -> int:
+    digest = hashlib.blake2b(scenario_id.encode(), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, 'little'), shards)
+
+
+def worker_main(factory: ScenariosFactory, queue: multiprocessing.Queue, concurrency: int = 1000) -> None:
+    asyncio.run(serve(factory, queue, concurrency))
+
+
+async def serve(factory: ScenariosFactory, queue: multiprocessing.Queue, concurrency: int = 1000) -> None:
+    """
+    Run messages from queue on scenarios made by factory until None is received.
+    No more than concurrency messages run at once, next message is not taken from queue until one of them is done
+    """
+    scenarios = list(factory())
+    dispatchers = {it.name: MailboxDispatcher(it) for it in scenarios}
+    loop = asyncio.get_running_loop()
+    running: Set[asyncio.Future] = set()
+    semaphore = asyncio.Semaphore(concurrency)
+    while True:
+        await semaphore.acquire()
+        message: Optional[Message] = await loop.run_in_executor(None, queue.get)
+        if message is None:
+            semaphore.release()
+            break
+        kind, name, scenario_id, event = message
+        dispatcher = dispatchers[name]
+        task = asyncio.ensure_future(dispatcher.dispatch(scenario_id, event) if kind == RUN_EVENT
+                                     else dispatcher.dispatch_planned(scenario_id))
+        running.add(task)
+        task.add_done_callback(partial(_finish, running, semaphore, message))
+    await asyncio.gather(*running, return_exceptions=True)
+    for scenario in scenarios:
+        close = getattr(scenario.store_repo, 'close', None)
+        if close:
+            await close()
+
+
+def _finish(running: Set[asyncio.Future], semaphore: asyncio.Semaphore, message: Message,
+            task: asyncio.Future) -> None:
+    running.discard(task)
+    semaphore.release()
+    if not task.cancelled() and task.exception():
+        logger.error('Run of %s failed', message, exc_info=task.exception())
+
+
+class ShardedWorkerPool:
+    """
+    Run scenarios in several processes. Every process has own event loop and scenarios, made by factory,
+    which must be picklable for spawn start method. Scenario ids are spread to workers by consistent hash,
+    so all events of scenario run in one worker, one by one. Every worker runs up to concurrency messages at once,
+    with queue_size set dispatch blocks (or raises queue.Full) when queue of worker is full
+    """
+
+    def __init__(self, factory: ScenariosFactory, workers: Optional[int] = None, queue_size: int = 0,
+                 context: Optional[multiprocessing.context.BaseContext] = None, concurrency: int = 1000):
+        self.factory = factory
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.context = context or multiprocessing.get_context()
+        self.queues: List[multiprocessing.Queue] = []
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            queue = self.context.Queue(self.queue_size)
+            process = self.context.Process(target=worker_main, args=(self.factory, queue, self.concurrency),
+                                           name=f'ltsched-worker-{i}', daemon=True)
+            process.start()
+            self.queues.append(queue)
+            self.processes.append(process)
+
+    def dispatch(self, name: str, scenario_id: ScenarioId, event: ScenarioEvent, block: bool = True,
+                 timeout: Optional[float] = None) -> None:
+        self.queues[shard_of(scenario_id, self.workers)].put((RUN_EVENT, name, scenario_id, event), block, timeout)
+
+    def dispatch_planned(self, name: str, scenario_ids: Iterable[ScenarioId], block: bool = True,
+                         timeout: Optional[float] = None) -> None:
+        for scenario_id in scenario_ids:
+            self.queues[shard_of(scenario_id, self.workers)].put((RUN_PLANNED, name, scenario_id, None),
+                                                                 block, timeout)
+
+    async def dispatch_async(self, name: str, scenario_id: ScenarioId, event: ScenarioEvent) -> None:
+        """
+        Dispatch from event loop, waiting for full queue of worker in thread
+        """
+        await self.put_async((RUN_EVENT, name, scenario_id, event))
+
+    async def dispatch_planned_async(self, name: str, scenario_ids: Iterable[ScenarioId]) -> None:
+        for scenario_id in scenario_ids:
+            await self.put_async((RUN_PLANNED, name, scenario_id, None))
+
+    async def put_async(self, message: Message) -> None:
+        queue = self.queues[shard_of(message[2], self.workers)]
+        try:
+            queue.put_nowait(message)
+        except Full:
+            await asyncio.get_running_loop().run_in_executor(None, queue.put, message)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until workers process queued messages and exit
+        """
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+        self.queues.clear()
+        self.processes.clear()
@@ -0,0 +1,106 @@
+import asyncio
+from collections import deque
+from datetime import timedelta
+from typing import List
+
+import pytest
+import pytest_asyncio
+
+from ltsched.admission import AdmissionController, EventSource, TokenBucket
+from ltsched.memory import MemoryScenarioStoreRepo
+from ltsched.model import BaseScenarioStore
+from ltsched.protocols import TaskScheduler
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordScenario(Scenario):
+    name = 'record'
+    start_state = 'wait'
+    end_states = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events: List[str] = []
+
+    @event_handler('*', [('wait', 'wait')])
+    def on_event(self, event):
+        self.events.append(event)
+        return HandlerResult(state='wait')
+
+
+@pytest_asyncio.fixture
+async def scenario(mocker):
+    repo = MemoryScenarioStoreRepo()
+    for i in range(10):
+        await repo.write_store(f'ID-{i}', BaseScenarioStore(state='wait'))
+    return RecordScenario(mocker.AsyncMock(spec=TaskScheduler), repo)
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    assert bucket.wait_time() == 0.5
+    clock.now = 0.5
+    assert bucket.take()
+
+
+@pytest.mark.asyncio
+async def test_external_events_first(scenario):
+    controller = AdmissionController([scenario], concurrency=1)
+    submits = [asyncio.ensure_future(controller.submit('record', f'ID-{i}', f'scheduled-{i}', EventSource.Scheduled))
+               for i in range(5)]
+    submits += [asyncio.ensure_future(controller.submit('record', f'ID-{i}', f'external-{i}')) for i in range(2)]
+    await asyncio.sleep(0)
+    runner = asyncio.ensure_future(controller.run())
+
+    await asyncio.gather(*submits)
+    runner.cancel()
+
+    assert scenario.events == ['external-0', 'external-1'] + [f'scheduled-{i}' for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_shed_scheduled_events(scenario):
+    clock = FakeClock()
+    controller = AdmissionController([scenario], concurrency=1, shed_threshold=2, max_delay=10,
+                                     defer_delay=timedelta(seconds=30), clock=clock)
+    submits = [asyncio.ensure_future(controller.submit('record', f'ID-{i}', f'scheduled-{i}', EventSource.Scheduled))
+               for i in range(3)]
+    await asyncio.sleep(0)
+
+    assert submits[2].done()
+    scenario.scheduler.schedule.assert_awaited_once_with(timedelta(seconds=30), 'run:record', 'ID-2', 'scheduled-2',
+                                                         task_id='run:record:ID-2')
+
+    clock.now = 11
+    runner = asyncio.ensure_future(controller.run())
+    await asyncio.gather(*submits)
+    runner.cancel()
+
+    assert controller.shed == 3
+    assert scenario.events == []
+
+
+@pytest.mark.asyncio
+async def test_rate_limit(scenario):
+    clock = FakeClock()
+    controller = AdmissionController([scenario], rate_limits={'record': (1, 1)}, clock=clock)
+    for i in range(2):
+        controller.queues.setdefault((EventSource.External, 'record'), deque()).append((f'ID-{i}', 'event', None, 0))
+    controller.current[(EventSource.External, 'record')] = 0
+
+    assert controller.select() == (EventSource.External, 'record')
+    assert controller.select() is None
+    assert controller.get_throttle_time() == 1
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from ltsched.buffer import BufferedTaskScheduler
+from ltsched.protocols import BatchTaskScheduler, ScheduleRequest, TaskScheduler
+
+
+@pytest.mark.asyncio
+async def test_coalesce_by_task_id(mocker):
+    scheduler = BufferedTaskScheduler(mocker.AsyncMock(spec=BatchTaskScheduler), window=0.01)
+
+    await asyncio.gather(scheduler.schedule(timedelta(seconds=1), 'run:a', 'ID', 'first', task_id='a', force=True),
+                         scheduler.schedule(timedelta(seconds=2), 'run:a', 'ID', 'second', task_id='a', force=True),
+                         scheduler.schedule(timedelta(seconds=3), 'run:a', 'ID', 'third', task_id='a'),
+                         scheduler.schedule(None, 'run:b', 'ID'),
+                         scheduler.schedule(None, 'run:b', 'ID'))
+
+    scheduler.scheduler.schedule_many.assert_awaited_once_with(
+        [ScheduleRequest(timedelta(seconds=2), 'run:a', ('ID', 'second'), 'a', True),
+         ScheduleRequest(None, 'run:b', ('ID',)),
+         ScheduleRequest(None, 'run:b', ('ID',))])
+    scheduler.scheduler.schedule.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flush_on_max_size(mocker):
+    scheduler = BufferedTaskScheduler(mocker.AsyncMock(spec=TaskScheduler), window=60, max_size=2)
+
+    await asyncio.wait_for(asyncio.gather(scheduler.schedule(None, 'task', 1, task_id='1'),
+                                          scheduler.schedule(None, 'task', 2, task_id='2')), 1)
+
+    assert scheduler.scheduler.schedule.await_args_list == [mocker.call(None, 'task', 1, task_id='1', force=False),
+                                                            mocker.call(None, 'task', 2, task_id='2', force=False)]
+
+
+@pytest.mark.asyncio
+async def test_flush_error(mocker):
+    scheduler = BufferedTaskScheduler(mocker.AsyncMock(spec=TaskScheduler), window=60)
+    scheduler.scheduler.schedule.side_effect = ConnectionError
+    schedule = asyncio.ensure_future(scheduler.schedule(None, 'task'))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ConnectionError):
+        await scheduler.flush()
+    with pytest.raises(ConnectionError):
+        await schedule
@@ -0,0 +1,83 @@
+from dataclasses import dataclass, field
+from typing import List, cast
+
+import pytest
+
+from ltsched.cache import CachedScenarioStoreRepo
+from ltsched.model import BaseScenarioStore, ScenarioId
+from ltsched.protocols import ScenarioStoreRepo
+
+SCENARIO_ID = cast(ScenarioId, 'ID')
+
+
+@dataclass
+class FakeStore(BaseScenarioStore):
+    items: List[str] = field(default_factory=list)
+
+
+@pytest.fixture
+def repo(mocker):
+    repo = CachedScenarioStoreRepo(mocker.AsyncMock(spec=ScenarioStoreRepo), max_size=2)
+    repo.repo.read_store.side_effect = lambda _: FakeStore(state='state')
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_read_through(repo):
+    store = await repo.read_store(SCENARIO_ID)
+    store.items.append('changed')
+
+    assert await repo.read_store(SCENARIO_ID) == FakeStore(state='state')
+    repo.repo.read_store.assert_awaited_once_with(SCENARIO_ID)
+
+    await repo.read_stores(['ID-2', 'ID-3'])
+    await repo.read_store(SCENARIO_ID)
+
+    assert repo.repo.read_store.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_skip_clean_write(repo):
+    store = await repo.read_store(SCENARIO_ID)
+    await repo.write_store(SCENARIO_ID, store)
+
+    repo.repo.write_store.assert_not_called()
+
+    store.items.append('changed')
+    await repo.write_store(SCENARIO_ID, store)
+    await repo.write_store(SCENARIO_ID, store)
+
+    repo.repo.write_store.assert_awaited_once_with(SCENARIO_ID, FakeStore(state='state', items=['changed']))
+
+
+@pytest.mark.asyncio
+async def test_compare_and_set(repo):
+    version, store = await repo.read_versioned(SCENARIO_ID)
+    store.state = 'state1'
+
+    assert await repo.compare_and_set(SCENARIO_ID, store, version)
+
+    store.state = 'state2'
+
+    assert not await repo.compare_and_set(SCENARIO_ID, store, version)
+    assert await repo.read_versioned(SCENARIO_ID) == (version + 1, FakeStore(state='state1'))
+
+
+@pytest.mark.asyncio
+async def test_compare_and_set_evicted(repo):
+    version, store = await repo.read_versioned(SCENARIO_ID)
+    other_version, other = await repo.read_versioned(SCENARIO_ID)
+    other.state = 'other'
+    assert await repo.compare_and_set(SCENARIO_ID, other, other_version)
+    await repo.read_stores(['ID-2', 'ID-3'])
+    store.state = 'stale'
+
+    assert not await repo.compare_and_set(SCENARIO_ID, store, version)
+
+    repo.repo.read_store.side_effect = lambda _: FakeStore(state='other')
+    version, store = await repo.read_versioned(SCENARIO_ID)
+    store.state = 'state1'
+
+    assert await repo.compare_and_set(SCENARIO_ID, store, version)
+    assert not await repo.compare_and_set(SCENARIO_ID, store, 0)
+    repo.repo.write_store.assert_awaited_with(SCENARIO_ID, FakeStore(state='state1'))
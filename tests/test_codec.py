@@ -0,0 +1,123 @@
+import pickle
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import pytest
+
+from ltsched.codec import ScenarioCodec
+from ltsched.model import (BaseScenarioEventObject, BaseScenarioStore, ScenarioError, ScenarioExecutionStatus,
+                           SlottedScenarioStore, slotted)
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+
+
+@dataclass
+class PayEvent(BaseScenarioEventObject):
+    type = 'pay'
+    amount: int
+    comment: str = ''
+
+
+@dataclass
+class OtherEvent(BaseScenarioEventObject):
+    type = 'other'
+    value: int = 0
+
+
+@slotted
+@dataclass
+class FakeStore(SlottedScenarioStore):
+    counter: int = 0
+    items: List[str] = field(default_factory=list)
+    attrs: Dict[str, float] = field(default_factory=dict)
+
+
+class FakeScenario(Scenario):
+    name = 'codec'
+    start_state = 'wait-payment'
+    end_states = frozenset(('paid',))
+
+    @event_handler('pay', [('wait-payment', 'paid')])
+    def on_pay(self, _):
+        return HandlerResult(state='paid')
+
+
+@pytest.fixture
+def codec():
+    return ScenarioCodec(FakeScenario, FakeStore, [PayEvent])
+
+
+def test_store(codec):
+    store = FakeStore(state='wait-payment', error='failed', next_run=datetime(2021, 1, 1, 12, 30),
+                      next_event=PayEvent(amount=-150, comment='юникод'), counter=2 ** 40,
+                      items=['a', 'b'], attrs={'x': 0.5, 'y': -1.0})
+    data = codec.encode_store(store)
+
+    assert codec.decode_store(data) == store
+    assert not hasattr(store, '__dict__')
+    assert len(data) < len(pickle.dumps(store, pickle.HIGHEST_PROTOCOL)) / 3
+
+
+@pytest.mark.parametrize('event', ('pay', 'unknown', PayEvent(amount=10)))
+def test_event(codec, event):
+    assert codec.decode_event(codec.encode_event(event)) == event
+
+
+def test_unknown_state():
+    codec = ScenarioCodec(FakeScenario)
+    store = BaseScenarioStore(state='other', exec_state=ScenarioExecutionStatus.Error, next_event='pay')
+
+    assert codec.decode_store(codec.encode_store(store)) == store
+    assert len(codec.encode_store(BaseScenarioStore(state='paid'))) == 10
+
+
+def test_version(codec):
+    with pytest.raises(ScenarioError):
+        codec.decode_event(b'\x00\x00\x01')
+
+
+def test_schema_changed(codec):
+    class NextScenario(FakeScenario):
+
+        @event_handler('cancel', [('wait-payment', 'canceled')])
+        def on_cancel(self, _):
+            return HandlerResult(state='canceled')
+
+    data = codec.encode_store(FakeStore(state='wait-payment'))
+
+    with pytest.raises(ScenarioError, match='other schema'):
+        ScenarioCodec(NextScenario, FakeStore, [PayEvent]).decode_store(data)
+    with pytest.raises(ScenarioError, match='other schema'):
+        ScenarioCodec(FakeScenario, BaseScenarioStore, [PayEvent]).decode_store(data)
+    assert ScenarioCodec(FakeScenario, FakeStore, [PayEvent]).decode_store(data) == FakeStore(state='wait-payment')
+
+
+def test_previous_schema(codec):
+    @dataclass
+    class NextStore(BaseScenarioStore):
+        counter: int = 0
+        total: int = 5
+
+    class NextScenario(FakeScenario):
+
+        @event_handler('cancel', [('wait-payment', 'canceled')])
+        def on_cancel(self, _):
+            return HandlerResult(state='canceled')
+
+    data = codec.encode_store(FakeStore(state='paid', next_event=PayEvent(amount=10), counter=3, items=['a']))
+    schema = pickle.loads(pickle.dumps(codec.schema))
+    next_codec = ScenarioCodec(NextScenario, NextStore, [PayEvent], previous_schemas=[schema])
+
+    assert next_codec.decode_store(data) == NextStore(state='paid', next_event=PayEvent(amount=10), counter=3)
+    assert next_codec.decode_store(next_codec.encode_store(NextStore(state='canceled'))) == \
+        NextStore(state='canceled')
+
+
+def test_unregistered_event_object(codec):
+    store = FakeStore(state='wait-payment', next_event=OtherEvent(value=1))
+
+    assert codec.decode_store(codec.encode_store(store)) == store
+    assert codec.decode_event(codec.encode_event(OtherEvent(value=2))) == OtherEvent(value=2)
+    with pytest.raises(ScenarioError, match="'pay' is not registered"):
+        ScenarioCodec(FakeScenario, FakeStore, previous_schemas=[codec.schema]).decode_event(
+            codec.encode_event(PayEvent(amount=1)))
@@ -2,6 +2,7 @@ from enum import Enum
 
 import pytest
 
+from ltsched.model import ScenarioError
 from ltsched.scenario import Scenario, event_handler, on_enter, on_exit, to_str_list
 
 
@@ -152,3 +153,156 @@ def test_add_transition_handlers():
     assert FakeScenario.transition_handlers['state2'] == [FakeScenario.handler1]
     assert FakeScenario.transition_handlers['state3'] == [FakeScenario.handler1, handler3]
     assert FakeScenario.transition_handlers['*'] == [handler2]
+
+
+def test_event_dispatch_resolve_wildcards():
+    class FakeScenario(Scenario):
+
+        @event_handler('signal1', [('*', 'state2')])
+        async def handler1(self, *args):
+            pass
+
+        @event_handler('*', [('state2', 'state3')])
+        async def handler2(self, *args):
+            pass
+
+    async def handler3(self, *args):
+        pass
+
+    assert FakeScenario.event_dispatch[('*', 'signal1')] == FakeScenario.handler1
+    assert FakeScenario.event_dispatch[('state2', '*')] == FakeScenario.handler2
+    assert ('state2', 'signal1') not in FakeScenario.event_dispatch
+
+    FakeScenario.add_event_handler('signal2', [('state3', 'state1')], handler3)
+
+    assert FakeScenario.event_dispatch[('state3', 'signal2')] == handler3
+    assert FakeScenario.event_dispatch[('state3', '*')] is None
+    assert ('state3', 'signal1') not in FakeScenario.event_dispatch
+
+
+def test_event_dispatch_size():
+    class FakeScenario(Scenario):
+        pass
+
+    async def handler(self, *args):
+        pass
+
+    for i in range(100):
+        FakeScenario.add_event_handler(f'signal{i}', [(f'state{i}', f'state{i + 1}')], handler)
+
+    assert len(FakeScenario.event_dispatch) == 201
+
+
+def test_transition_dispatch_resolve_wildcards():
+    class FakeScenario(Scenario):
+
+        @on_exit('state1')
+        async def handler1(self, *args):
+            pass
+
+        @on_enter('*')
+        async def handler2(self, *args):
+            pass
+
+    async def handler3(*args):
+        pass
+
+    FakeScenario.add_enter_handler('state1', handler3)
+
+    assert FakeScenario.transition_dispatch[('state1', True)] == ((FakeScenario.handler1,),)
+    assert FakeScenario.transition_dispatch[('state1', False)] == ((handler3,), (FakeScenario.handler2,))
+    assert FakeScenario.transition_dispatch[('*', False)] == ((FakeScenario.handler2,),)
+    assert FakeScenario.transition_handlers['*'] == [FakeScenario.handler2]
+
+
+def test_transition_dispatch_groups():
+    class FakeScenario(Scenario):
+
+        @on_enter('state1', independent=True)
+        async def handler1(self, *args):
+            pass
+
+        @on_enter('state1', independent=True)
+        async def handler2(self, *args):
+            pass
+
+        @on_enter('state1')
+        async def handler3(self, *args):
+            pass
+
+        @on_enter('*', independent=True)
+        async def handler4(self, *args):
+            pass
+
+    assert FakeScenario.transition_dispatch[('state1', False)] == (
+        (FakeScenario.handler1, FakeScenario.handler2), (FakeScenario.handler3,), (FakeScenario.handler4,))
+
+
+def test_compile_graph():
+    class FakeScenario(Scenario):
+        start_state = 'new'
+        end_states = frozenset(('done',))
+
+        @event_handler('start', [('new', 'work')])
+        async def handler1(self, *args):
+            pass
+
+        @event_handler('finish', [('work', 'done, stuck')])
+        async def handler2(self, *args):
+            pass
+
+        @event_handler('*', [('lost', '*')])
+        async def handler3(self, *args):
+            pass
+
+    graph = FakeScenario.graph
+
+    assert graph.states == ('done', 'lost', 'new', 'stuck', 'work')
+    assert graph.out_masks[FakeScenario.handler2] == graph.bits['done'] | graph.bits['stuck']
+    assert graph.out_masks[FakeScenario.handler3] is None
+    assert graph.unreachable == {'lost'}
+    assert graph.dead_ends == {'stuck'}
+    assert graph.edges == (('lost', '*', '*'), ('new', 'start', 'work'), ('work', 'finish', 'done'),
+                           ('work', 'finish', 'stuck'))
+    assert '"work" -> "stuck" [label="finish"];' in graph.to_dot()
+
+    async def handler4(self, *args):
+        pass
+
+    FakeScenario.add_event_handler('retry', [('stuck', 'work')], handler4)
+
+    assert FakeScenario.graph.dead_ends == set()
+
+
+def test_compile_graph_converge():
+    class FakeScenario(Scenario):
+        start_state = 'new'
+        end_states = frozenset(('done',))
+        validate_graph = True
+
+        @event_handler('split', [('new', 'left, right')])
+        async def handler1(self, *args):
+            pass
+
+        @event_handler('merge', [('left, right', 'merged')])
+        async def handler2(self, *args):
+            pass
+
+        @event_handler('finish', [('merged', 'done')])
+        async def handler3(self, *args):
+            pass
+
+    assert FakeScenario.graph.unreachable == set()
+    assert FakeScenario.graph.dead_ends == set()
+
+
+def test_validate_graph():
+    with pytest.raises(ScenarioError, match=r"unreachable states \['lost'\]"):
+        class FakeScenario(Scenario):
+            start_state = 'new'
+            end_states = frozenset(('done',))
+            validate_graph = True
+
+            @event_handler('finish', [('new, lost', 'done')])
+            async def handler1(self, *args):
+                pass
@@ -0,0 +1,121 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, cast
+
+import pytest
+
+from ltsched.dispatcher import MailboxDispatcher
+from ltsched.model import BaseScenarioStore, ScenarioId, ScenarioWarning
+from ltsched.protocols import ScenarioStoreRepo, TaskScheduler
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+
+
+class CounterScenario(Scenario):
+    name = 'counter'
+    start_state = 'count'
+    end_states = frozenset(('done',))
+
+    @event_handler('inc', [('count', 'count, done')])
+    async def on_inc(self, event):
+        await asyncio.sleep(0)
+        self.store.error = str(int(self.store.error or 0) + 1)
+        return HandlerResult(state='done' if self.store.error == '3' else 'count')
+
+
+@dataclass
+class ListStore(BaseScenarioStore):
+    items: List[str] = field(default_factory=list)
+
+
+class ListScenario(Scenario):
+    name = 'list'
+    start_state = 'wait'
+    end_states = frozenset()
+
+    @event_handler('*', [('wait', 'wait')])
+    async def on_event(self, event):
+        self.store.items.append(event)
+        if event == 'bad':
+            raise RuntimeError(event)
+        return HandlerResult(state='wait')
+
+
+@pytest.fixture
+def dispatcher(mocker):
+    scenario = CounterScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.store_repo.read_store.side_effect = lambda _: BaseScenarioStore(state='count')
+    return MailboxDispatcher(scenario)
+
+
+@pytest.mark.asyncio
+async def test_serialize_events(dispatcher):
+    scenario_id = cast(ScenarioId, 'ID')
+
+    await asyncio.gather(*(dispatcher.dispatch(scenario_id, 'inc') for _ in range(5)))
+
+    repo = dispatcher.scenario.store_repo
+    repo.read_store.assert_awaited_once_with(scenario_id)
+    repo.write_store.assert_awaited_once()
+    store = repo.write_store.await_args.args[1]
+    assert store.state == 'done'
+    assert store.error == '3'
+    assert not dispatcher.mailboxes
+
+
+@pytest.mark.asyncio
+async def test_failed_event(dispatcher):
+    scenario_id = cast(ScenarioId, 'ID')
+
+    results = await asyncio.gather(dispatcher.dispatch(scenario_id, 'inc'),
+                                   dispatcher.dispatch(scenario_id, 'unknown'),
+                                   dispatcher.dispatch(scenario_id, 'inc'),
+                                   return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], ScenarioWarning)
+    assert results[2] is None
+    store = dispatcher.scenario.store_repo.write_store.await_args.args[1]
+    assert store.error == '2'
+
+
+@pytest.mark.asyncio
+async def test_failed_event_rollback(mocker):
+    scenario = ListScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.store_repo.read_store.side_effect = lambda _: ListStore(state='wait')
+    dispatcher = MailboxDispatcher(scenario)
+    scenario_id = cast(ScenarioId, 'ID')
+
+    results = await asyncio.gather(dispatcher.dispatch(scenario_id, 'ok'), dispatcher.dispatch(scenario_id, 'bad'),
+                                   return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], RuntimeError)
+    scenario.store_repo.write_store.assert_awaited_once_with(scenario_id, ListStore(state='wait', items=['ok']))
+
+
+@pytest.mark.asyncio
+async def test_dispatch_planned(dispatcher):
+    scenario_id = cast(ScenarioId, 'ID')
+    dispatcher.scenario.store_repo.read_store.side_effect = lambda _: BaseScenarioStore(
+        state='count', next_run=datetime(2021, 1, 1), next_event='inc')
+
+    await asyncio.gather(dispatcher.dispatch_planned(scenario_id), dispatcher.dispatch_planned(scenario_id))
+
+    store = dispatcher.scenario.store_repo.write_store.await_args.args[1]
+    assert store == BaseScenarioStore(state='count', error='1')
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller(dispatcher):
+    scenario_id = cast(ScenarioId, 'ID')
+    first = asyncio.ensure_future(dispatcher.dispatch(scenario_id, 'inc'))
+    second = asyncio.ensure_future(dispatcher.dispatch(scenario_id, 'inc'))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await second
+
+    assert first.cancelled()
+    store = dispatcher.scenario.store_repo.write_store.await_args.args[1]
+    assert store.error == '2'
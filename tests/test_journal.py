@@ -0,0 +1,81 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, cast
+
+import pytest
+
+from ltsched.journal import DELTA, FULL, JournalScenarioStoreRepo
+from ltsched.model import BaseScenarioStore, ScenarioId
+from ltsched.protocols import TaskScheduler
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+
+SCENARIO_ID = cast(ScenarioId, 'ID')
+
+
+@dataclass
+class FakeStore(BaseScenarioStore):
+    items: List[str] = field(default_factory=list)
+
+
+class AppendScenario(Scenario):
+    name = 'append'
+    start_state = 'wait'
+    end_states = frozenset()
+
+    @event_handler('*', [('wait', 'wait')])
+    def on_event(self, event):
+        self.store.items.append(event)
+        return HandlerResult(state='wait', next_event='tick', next_run=timedelta(minutes=1))
+
+
+@pytest.mark.asyncio
+async def test_journal_replay(tmp_path, mocker):
+    repo = JournalScenarioStoreRepo(str(tmp_path))
+    scenario = AppendScenario(mocker.AsyncMock(spec=TaskScheduler), repo)
+    await repo.write_store(SCENARIO_ID, FakeStore(state='wait'))
+    for event in ('a', 'b'):
+        await scenario.run(SCENARIO_ID, event)
+    await repo.close()
+
+    repo = JournalScenarioStoreRepo(str(tmp_path))
+
+    assert await repo.read_store(SCENARIO_ID) == FakeStore(state='wait', items=['a', 'b'])
+    history = await repo.history(SCENARIO_ID)
+    assert [it[0] for it in history] == [FULL, DELTA, DELTA]
+    result = HandlerResult(state='wait', next_event='tick', next_run=timedelta(minutes=1))
+    assert [it[2:] for it in history][1:] == [('a', result, {'items': ['a']}), ('b', result, {'items': ['a', 'b']})]
+    await repo.close()
+
+
+@pytest.mark.asyncio
+async def test_journal_snapshot(tmp_path):
+    repo = JournalScenarioStoreRepo(str(tmp_path), snapshot_every=3, segment_size=256, keep_history=False)
+    for i in range(10):
+        await repo.write_store(SCENARIO_ID, FakeStore(state=f'state{i}', items=['x' * 100] * (i % 2),
+                                                      next_run=datetime(2021, 1, 1)))
+    await repo.close()
+
+    repo = JournalScenarioStoreRepo(str(tmp_path))
+
+    assert await repo.read_store(SCENARIO_ID) == FakeStore(state='state9', items=['x' * 100],
+                                                           next_run=datetime(2021, 1, 1))
+    assert await repo.search_planned(datetime(2021, 1, 2)) == [SCENARIO_ID]
+    assert len([it for it in os.listdir(tmp_path) if it.startswith('snapshot')]) == 1
+    await repo.close()
+
+
+@pytest.mark.asyncio
+async def test_journal_snapshot_in_thread(tmp_path, mocker):
+    repo = JournalScenarioStoreRepo(str(tmp_path), snapshot_every=2)
+    threads = []
+    write_snapshot = repo.write_snapshot
+    mocker.patch.object(repo, 'write_snapshot',
+                        side_effect=lambda stores: threads.append(threading.current_thread()) or write_snapshot(stores))
+    for i in range(2):
+        await repo.write_store(SCENARIO_ID, FakeStore(state=f'state{i}'))
+    await repo.close()
+
+    assert len(threads) == 1 and threads[0] is not threading.current_thread()
+    assert len([it for it in os.listdir(tmp_path) if it.startswith('snapshot')]) == 1
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import cast
+
+import pytest
+
+from ltsched.memory import MemoryScenarioStoreRepo
+from ltsched.model import BaseScenarioStore, ScenarioExecutionStatus, ScenarioId
+
+NOW = datetime(2021, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_read_write_store():
+    repo = MemoryScenarioStoreRepo()
+    store = BaseScenarioStore(state='state1')
+    await repo.write_store(cast(ScenarioId, 'ID'), store)
+    store.state = 'state2'
+
+    assert await repo.read_store(cast(ScenarioId, 'ID')) == BaseScenarioStore(state='state1')
+    assert await repo.read_store(cast(ScenarioId, 'OTHER')) is None
+
+
+@pytest.mark.asyncio
+async def test_search_planned():
+    repo = MemoryScenarioStoreRepo()
+    for i in range(5):
+        await repo.write_store(cast(ScenarioId, f'ID-{i}'),
+                               BaseScenarioStore(state='state', next_run=NOW + timedelta(minutes=i)))
+    await repo.write_store(cast(ScenarioId, 'ID-0'), BaseScenarioStore(state='state',
+                                                                        next_run=NOW + timedelta(minutes=10)))
+    await repo.write_store(cast(ScenarioId, 'ID-1'), BaseScenarioStore(state='state',
+                                                                        exec_state=ScenarioExecutionStatus.Finished,
+                                                                        next_run=NOW))
+
+    assert await repo.search_planned(NOW + timedelta(minutes=4)) == ['ID-2', 'ID-3']
+    assert await repo.search_planned(NOW + timedelta(minutes=4)) == ['ID-2', 'ID-3']
+    assert await repo.search_planned(NOW + timedelta(hours=1)) == ['ID-2', 'ID-3', 'ID-4', 'ID-0']
+
+    assert await repo.next_planned() == NOW + timedelta(minutes=2)
+    assert await repo.next_planned(NOW + timedelta(minutes=3)) == NOW + timedelta(minutes=4)
+    assert await repo.next_planned(NOW + timedelta(minutes=10)) is None
+
+    assert repo.pop_planned(NOW + timedelta(minutes=4)) == ['ID-2', 'ID-3']
+    assert await repo.search_planned(NOW + timedelta(hours=1)) == ['ID-4', 'ID-0']
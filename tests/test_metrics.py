@@ -0,0 +1,61 @@
+from enum import Enum
+from typing import cast
+
+import pytest
+
+from ltsched.memory import MemoryScenarioStoreRepo
+from ltsched.metrics import LatencyHistogram, MetricsObserver
+from ltsched.model import BaseScenarioStore, ScenarioId
+from ltsched.protocols import TaskScheduler
+from ltsched.scenario import HandlerResult, Scenario, event_handler, on_enter
+
+SCENARIO_ID = cast(ScenarioId, 'ID')
+
+
+class State(Enum):
+    Wait = 'wait'
+    Done = 'done'
+
+
+class MeteredScenario(Scenario):
+    name = 'metered'
+    start_state = State.Wait
+    end_states = frozenset((State.Done,))
+
+    @event_handler('signal', [(State.Wait, State.Done)])
+    def on_signal(self, _):
+        return HandlerResult(state=State.Done.value)
+
+    @on_enter(State.Done)
+    def on_done(self):
+        pass
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for it in range(1, 1001):
+        histogram.record(it / 1e6)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(50) == pytest.approx(500e-6, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(990e-6, rel=0.01)
+    assert histogram.percentile(100) == histogram.max == 1000e-6
+    assert LatencyHistogram().percentile(50) == 0
+
+
+@pytest.mark.asyncio
+async def test_observe_run(mocker):
+    observer = MetricsObserver()
+    repo = MemoryScenarioStoreRepo()
+    await repo.write_store(SCENARIO_ID, BaseScenarioStore(state='wait'))
+    scenario = MeteredScenario(mocker.AsyncMock(spec=TaskScheduler), repo, observer=observer)
+
+    await scenario.run(SCENARIO_ID, 'signal')
+
+    phases = {key[1:]: it.count for key, it in observer.histograms.items()}
+    assert phases == {('read', 'wait', 'signal', None): 1,
+                      ('handler', 'wait', 'signal', 'on_signal'): 1,
+                      ('enter', 'done', 'signal', 'on_done'): 1,
+                      ('write', 'done', 'signal', None): 1}
+    assert observer.transitions == {('metered', 'wait', 'done'): 1}
+    assert observer.summary()[('metered', 'write', 'done', 'signal', None)]['count'] == 1
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import cast
+
+import pytest
+
+from ltsched.cache import CachedScenarioStoreRepo
+from ltsched.dispatcher import MailboxDispatcher
+from ltsched.memory import MemoryScenarioStoreRepo
+from ltsched.model import BaseScenarioStore, ScenarioError, ScenarioExecutionStatus, ScenarioId
+from ltsched.planner import PlannedRunDriver, iter_planned
+from ltsched.protocols import ScenarioStoreRepo, TaskScheduler
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+from ltsched.sqlite import SqliteScenarioStoreRepo
+
+NOW = datetime(2021, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_iter_planned_adapter(mocker):
+    store_repo = mocker.AsyncMock(spec=ScenarioStoreRepo)
+    store_repo.search_planned.return_value = (f'ID-{i}' for i in range(5))
+
+    pages = [it async for it in iter_planned(store_repo, NOW, batch_size=2)]
+
+    assert pages == [['ID-0', 'ID-1'], ['ID-2', 'ID-3'], ['ID-4']]
+    store_repo.search_planned.assert_awaited_once_with(NOW)
+
+
+@pytest.mark.asyncio
+async def test_iter_planned_paged_repo():
+    store_repo = MemoryScenarioStoreRepo()
+    for i in range(5):
+        await store_repo.write_store(cast(ScenarioId, f'ID-{i}'),
+                                     BaseScenarioStore(state='state', next_run=NOW - timedelta(minutes=5 - i)))
+
+    pages = [it async for it in iter_planned(store_repo, NOW, batch_size=3)]
+
+    assert pages == [['ID-0', 'ID-1', 'ID-2'], ['ID-3', 'ID-4']]
+
+
+class PlannedScenario(Scenario):
+    name = 'planned'
+    start_state = 'wait'
+    end_states = frozenset(('done',))
+    plan_in_store = True
+
+    @event_handler('start', [('wait', 'wait')])
+    def on_start(self, _):
+        return HandlerResult(state='wait', next_event='timeout', next_run=timedelta(minutes=1))
+
+    @event_handler('timeout', [('wait', 'done')])
+    def on_timeout(self, _):
+        return HandlerResult(state='done')
+
+
+@pytest.mark.asyncio
+async def test_plan_in_store(mocker):
+    clock = mocker.Mock(return_value=NOW)
+    scenario = PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), MemoryScenarioStoreRepo(), clock)
+    scenario_id = cast(ScenarioId, 'ID')
+    await scenario.store_repo.write_store(scenario_id, BaseScenarioStore(state='wait'))
+
+    await scenario.run(scenario_id, 'start')
+    await scenario.run_planned(scenario_id)
+
+    assert await scenario.store_repo.read_store(scenario_id) == BaseScenarioStore(
+        state='wait', next_run=NOW + timedelta(minutes=1), next_event='timeout')
+    scenario.scheduler.schedule.assert_not_called()
+
+    clock.return_value = NOW + timedelta(minutes=2)
+    await scenario.run_planned(scenario_id)
+
+    assert await scenario.store_repo.read_store(scenario_id) == BaseScenarioStore(
+        state='done', exec_state=ScenarioExecutionStatus.Finished)
+
+
+@pytest.mark.asyncio
+async def test_planned_run_driver(mocker):
+    clock = mocker.Mock(return_value=NOW + timedelta(minutes=2))
+    scenario = PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), MemoryScenarioStoreRepo(), clock)
+    for i in range(10):
+        await scenario.store_repo.write_store(cast(ScenarioId, f'ID-{i}'), BaseScenarioStore(
+            state='wait', next_run=NOW if i % 2 else NOW + timedelta(minutes=5), next_event='timeout'))
+    driver = PlannedRunDriver([scenario], concurrency=2, queue_size=2, poll_interval=600, clock=clock)
+    workers = [asyncio.ensure_future(driver.work()) for _ in range(driver.concurrency)]
+
+    await driver.sweep()
+    await driver.queue.join()
+    for worker in workers:
+        worker.cancel()
+
+    stores = scenario.store_repo.stores
+    assert [k for k, v in stores.items() if v.state == 'done'] == ['ID-1', 'ID-3', 'ID-5', 'ID-7', 'ID-9']
+    assert await driver.get_sleep_time() == 180
+    assert not driver.active
+
+
+@pytest.mark.asyncio
+async def test_planned_run_driver_retry(mocker):
+    clock = mocker.Mock(return_value=NOW)
+    scenario = PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), MemoryScenarioStoreRepo(), clock)
+    scenario_id = cast(ScenarioId, 'ID')
+    await scenario.store_repo.write_store(scenario_id, BaseScenarioStore(state='wait', next_run=NOW,
+                                                                        next_event='timeout'))
+    driver = PlannedRunDriver([scenario], concurrency=1, clock=lambda: NOW + timedelta(seconds=1))
+    dispatch_planned = mocker.patch.object(driver.dispatchers['planned'], 'dispatch_planned',
+                                           side_effect=[ConnectionError, None])
+    worker = asyncio.ensure_future(driver.work())
+
+    for _ in range(2):
+        await driver.sweep()
+        await driver.queue.join()
+    worker.cancel()
+
+    assert dispatch_planned.await_args_list == [mocker.call(scenario_id), mocker.call(scenario_id)]
+
+
+@pytest.mark.asyncio
+async def test_planned_run_driver_mailbox(mocker):
+    clock = mocker.Mock(return_value=NOW + timedelta(minutes=2))
+    scenario = PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), MemoryScenarioStoreRepo(), clock)
+    scenario_id = cast(ScenarioId, 'ID')
+    await scenario.store_repo.write_store(scenario_id, BaseScenarioStore(state='wait', next_run=NOW,
+                                                                        next_event='timeout'))
+    dispatcher = MailboxDispatcher(scenario)
+    driver = PlannedRunDriver([scenario], concurrency=1, clock=clock, dispatchers=[dispatcher])
+    worker = asyncio.ensure_future(driver.work())
+
+    await driver.sweep()
+    await asyncio.gather(driver.queue.join(), dispatcher.dispatch(scenario_id, 'start'))
+    worker.cancel()
+
+    assert driver.dispatchers['planned'] is dispatcher
+    assert scenario.store_repo.stores[scenario_id].state == 'done'
+
+
+@pytest.mark.asyncio
+async def test_planned_run_driver_overdue(mocker):
+    scenario = PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), MemoryScenarioStoreRepo())
+    for i, next_run in enumerate((NOW - timedelta(minutes=1), NOW + timedelta(seconds=30))):
+        await scenario.store_repo.write_store(cast(ScenarioId, f'ID-{i}'), BaseScenarioStore(
+            state='wait', next_run=next_run, next_event='timeout'))
+    driver = PlannedRunDriver([scenario], poll_interval=600, clock=lambda: NOW)
+
+    assert await driver.get_sleep_time() == 30
+
+
+class OtherPlannedScenario(PlannedScenario):
+    name = 'other-planned'
+
+
+def test_shared_repo(mocker, tmp_path):
+    store_repo = MemoryScenarioStoreRepo()
+
+    with pytest.raises(ScenarioError, match='share store repo'):
+        PlannedRunDriver([PlannedScenario(mocker.AsyncMock(spec=TaskScheduler), store_repo),
+                          OtherPlannedScenario(mocker.AsyncMock(spec=TaskScheduler),
+                                               CachedScenarioStoreRepo(store_repo))])
+    with pytest.raises(ScenarioError, match='share store repo'):
+        PlannedRunDriver([PlannedScenario(mocker.AsyncMock(spec=TaskScheduler),
+                                          SqliteScenarioStoreRepo(str(tmp_path / 'db'))),
+                          OtherPlannedScenario(mocker.AsyncMock(spec=TaskScheduler),
+                                               SqliteScenarioStoreRepo(str(tmp_path / 'db')))])
+
+    PlannedRunDriver([PlannedScenario(mocker.AsyncMock(spec=TaskScheduler),
+                                      SqliteScenarioStoreRepo(str(tmp_path / 'db'))),
+                      OtherPlannedScenario(mocker.AsyncMock(spec=TaskScheduler),
+                                           SqliteScenarioStoreRepo(str(tmp_path / 'db'), table='other'))])
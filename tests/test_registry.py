@@ -0,0 +1,57 @@
+import sys
+import textwrap
+
+import pytest
+
+from ltsched.model import ScenarioError
+from ltsched.registry import ScenarioRegistry, scenario_registry
+from ltsched.scenario import Scenario
+
+
+def test_register_on_create():
+    class RegisteredScenario(Scenario):
+        name = 'registered'
+
+    class ChildScenario(RegisteredScenario):
+        pass
+
+    assert scenario_registry.get('registered') is RegisteredScenario
+    assert scenario_registry.get_by_task('run:registered') is RegisteredScenario
+
+
+def test_lazy_load(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_scenario.py').write_text(textwrap.dedent('''
+        from ltsched.scenario import Scenario
+
+        class LazyScenario(Scenario):
+            name = 'lazy'
+    '''))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    scenario_registry.register_lazy('lazy', 'lazy_scenario:LazyScenario')
+
+    assert 'lazy_scenario' not in sys.modules
+    assert scenario_registry.get_by_task('run:lazy') is sys.modules['lazy_scenario'].LazyScenario
+
+
+def test_name_taken():
+    def create():
+        class TakenScenario(Scenario):
+            name = 'taken'
+
+        return TakenScenario
+
+    first, second = create(), create()
+
+    assert scenario_registry.get('taken') is second is not first
+    with pytest.raises(ScenarioError, match='already taken'):
+        class OtherScenario(Scenario):
+            name = 'taken'
+
+
+def test_not_registered():
+    registry = ScenarioRegistry()
+
+    with pytest.raises(ScenarioError):
+        registry.get('unknown')
+    with pytest.raises(ScenarioError):
+        registry.get_by_task('other:unknown')
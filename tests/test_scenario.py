@@ -1,11 +1,19 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import cast
+from typing import List, cast
 
 import pytest
 
-from ltsched.model import BaseScenarioEventObject, BaseScenarioStore, ScenarioId
-from ltsched.protocols import ScenarioStoreRepo, TaskScheduler
-from ltsched.scenario import HandlerResult, Scenario, event_handler
+from ltsched.model import (BaseScenarioEventObject, BaseScenarioStore, ScenarioError, ScenarioExecutionStatus,
+                           ScenarioHandlersError, ScenarioId, ScenarioWarning)
+from ltsched.protocols import (BatchScenarioStoreRepo, BatchTaskScheduler, ScenarioStoreRepo, ScheduleRequest,
+                               TaskScheduler)
+from ltsched.scenario import HandlerExecution, HandlerResult, Scenario, event_handler, on_enter
 
 
 class FakeState(Enum):
@@ -24,6 +32,11 @@ class FlagEvent(BaseScenarioEventObject):
     type = Event.Flag
 
 
+@dataclass
+class ListStore(BaseScenarioStore):
+    items: List[str] = field(default_factory=list)
+
+
 class FakeScenario(Scenario):
     name = 'fake'
     start_state = FakeState.WaitSignal
@@ -102,3 +115,247 @@ async def test_async_transition_handlers(scenario, mocker):
     on_enter.assert_awaited()
     on_exit.assert_awaited()
     handler2.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_run_batch_fallback(scenario):
+    scenario.add_event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)],
+                               lambda _: HandlerResult(state=FakeState.WaitFlag.value))
+    stores = {'ID-1': BaseScenarioStore(state='wait-signal'), 'ID-2': BaseScenarioStore(state='wait-flag')}
+    scenario.store_repo.read_store.side_effect = stores.get
+
+    errors = await scenario.run_batch([(cast(ScenarioId, 'ID-1'), Event.Signal.value),
+                                       (cast(ScenarioId, 'ID-2'), Event.Signal.value),
+                                       (cast(ScenarioId, 'ID-3'), Event.Signal.value)])
+
+    assert errors[0] is None
+    assert isinstance(errors[1], ScenarioWarning)
+    assert isinstance(errors[2], ScenarioError)
+    assert scenario.store_repo.read_store.await_count == 3
+    scenario.store_repo.write_store.assert_awaited_once_with('ID-1', BaseScenarioStore(state='wait-flag'))
+
+
+@pytest.mark.asyncio
+async def test_run_batch_bulk_repo(mocker):
+    store_repo = mocker.AsyncMock(spec=BatchScenarioStoreRepo)
+    scenario = FakeScenario(mocker.AsyncMock(spec=TaskScheduler), store_repo)
+    scenario.add_event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)],
+                               lambda _: HandlerResult(state=FakeState.WaitFlag.value))
+    store_repo.read_stores.return_value = {'ID-1': BaseScenarioStore(state='wait-signal'),
+                                           'ID-2': BaseScenarioStore(state='wait-signal')}
+
+    await scenario.run_batch([(cast(ScenarioId, 'ID-1'), Event.Signal.value),
+                              (cast(ScenarioId, 'ID-2'), Event.Signal.value)])
+
+    store_repo.read_stores.assert_awaited_once_with(['ID-1', 'ID-2'])
+    store_repo.write_stores.assert_awaited_once_with({'ID-1': BaseScenarioStore(state='wait-flag'),
+                                                      'ID-2': BaseScenarioStore(state='wait-flag')})
+    store_repo.read_store.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_run_batch_restore_failed_item(scenario):
+    def on_event(event):
+        scenario.store.error = event
+        scenario.store.items.append(event)
+        if event == 'partial':
+            raise RuntimeError(event)
+        return HandlerResult(state=FakeState.WaitSignal.value)
+
+    scenario.add_event_handler('complete, partial', [(FakeState.WaitSignal, FakeState.WaitSignal)], on_event)
+    scenario.store_repo.read_store.side_effect = lambda _: ListStore(state='wait-signal')
+
+    errors = await scenario.run_batch([(cast(ScenarioId, 'ID'), 'complete'), (cast(ScenarioId, 'ID'), 'partial')])
+
+    assert isinstance(errors[1], RuntimeError)
+    scenario.store_repo.write_store.assert_awaited_once_with('ID', ListStore(state='wait-signal', error='complete',
+                                                                             items=['complete']))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_runs(scenario):
+    seen = {}
+
+    async def on_event(event):
+        await asyncio.sleep(0)
+        seen[scenario.scenario_id] = (event, scenario.store.state)
+        return HandlerResult(state=FakeState.WaitFlag.value)
+
+    scenario.add_event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)], on_event)
+    scenario.store_repo.read_store.side_effect = lambda _: BaseScenarioStore(state='wait-signal')
+
+    await asyncio.gather(*(scenario.run(cast(ScenarioId, f'ID-{i}'), 'signal') for i in range(10)))
+
+    assert seen == {f'ID-{i}': ('signal', 'wait-signal') for i in range(10)}
+    assert scenario.scenario_id is None
+    assert scenario.store_repo.write_store.await_count == 10
+
+
+class ChainScenario(Scenario):
+    name = 'chain'
+    start_state = 'step0'
+    end_states = frozenset(('step3',))
+    run_to_completion = True
+
+    @event_handler('next', [('step0, step1, step2', 'step1, step2, step3')])
+    def on_next(self, _):
+        step = int(self.store.state[-1]) + 1
+        return HandlerResult(state=f'step{step}', next_event='next')
+
+
+@pytest.mark.asyncio
+async def test_run_to_completion(mocker):
+    scenario = ChainScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.store_repo.read_store.return_value = BaseScenarioStore(state='step0')
+
+    await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), 'next')
+
+    scenario.store_repo.write_store.assert_awaited_once_with('SCENARIO-ID', BaseScenarioStore(
+        state='step3', exec_state=ScenarioExecutionStatus.Finished))
+    scenario.scheduler.schedule.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_run_to_completion_depth(mocker):
+    scenario = ChainScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.max_chain_depth = 1
+    scenario.store_repo.read_store.return_value = BaseScenarioStore(state='step0')
+
+    await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), 'next')
+
+    scenario.store_repo.write_store.assert_awaited_once_with('SCENARIO-ID', BaseScenarioStore(state='step2'))
+    scenario.scheduler.schedule.assert_awaited_once_with(None, 'run:chain', 'SCENARIO-ID', 'next',
+                                                         task_id='run:chain:SCENARIO-ID', force=True)
+
+
+@pytest.mark.asyncio
+async def test_run_batch_schedule_many(mocker):
+    scheduler = mocker.AsyncMock(spec=BatchTaskScheduler)
+    scenario = ChainScenario(scheduler, mocker.AsyncMock(spec=BatchScenarioStoreRepo))
+    scenario.run_to_completion = False
+    scenario.store_repo.read_stores.return_value = {'ID-1': BaseScenarioStore(state='step0'),
+                                                    'ID-2': BaseScenarioStore(state='step2')}
+
+    await scenario.run_batch([(cast(ScenarioId, 'ID-1'), 'next'), (cast(ScenarioId, 'ID-2'), 'next')])
+
+    scheduler.schedule_many.assert_awaited_once_with([ScheduleRequest(None, 'run:chain', ('ID-1', 'next'),
+                                                                      task_id='run:chain:ID-1', force=True)])
+    scheduler.schedule.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_thread_event_handler(scenario, mocker):
+    threads = []
+
+    def on_event(_):
+        threads.append(threading.get_ident())
+        scenario.store.error = 'changed in thread'
+        return HandlerResult(state=FakeState.WaitFlag.value)
+
+    scenario.add_event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)], on_event,
+                               execution=HandlerExecution.Thread)
+    scenario.store_repo.read_store.return_value = BaseScenarioStore(state='wait-signal')
+
+    await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), Event.Signal.value)
+
+    assert threads != [threading.get_ident()]
+    scenario.store_repo.write_store.assert_awaited_with('SCENARIO-ID', BaseScenarioStore(state='wait-flag',
+                                                                                         error='changed in thread'))
+
+
+@pytest.mark.asyncio
+async def test_handler_timeout(mocker):
+    class SlowScenario(Scenario):
+        name = 'slow'
+        end_states = frozenset()
+
+        @event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)])
+        def on_signal(self, _):
+            return HandlerResult(state=FakeState.WaitFlag.value)
+
+    SlowScenario.add_enter_handler('*', lambda: time.sleep(0.2), execution=HandlerExecution.Thread, timeout=0.01)
+    scenario = SlowScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.store_repo.read_store.return_value = BaseScenarioStore(state='wait-signal')
+
+    with pytest.raises(ScenarioError):
+        await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), Event.Signal.value)
+
+    scenario.store_repo.write_store.assert_not_called()
+
+
+class ProcessScenario(Scenario):
+    name = 'process'
+    start_state = 'wait'
+    end_states = frozenset()
+
+    @event_handler('go', [('wait', 'gone')], execution=HandlerExecution.Process)
+    @staticmethod
+    def on_go(store, event):
+        return HandlerResult(state='gone', next_event=f'{store.state}:{event}:{os.getpid()}')
+
+
+def leave_in_process(store):
+    assert store.state == 'wait'
+
+
+@pytest.mark.asyncio
+async def test_process_event_handler(mocker):
+    ProcessScenario.add_exit_handler('wait', leave_in_process, execution=HandlerExecution.Process)
+    with ProcessPoolExecutor(1) as executor:
+        scenario = ProcessScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo),
+                                   executors={HandlerExecution.Process: executor})
+        scenario.store_repo.read_store.return_value = BaseScenarioStore(state='wait')
+
+        await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), 'go')
+
+    next_event = scenario.scheduler.schedule.await_args.args[3]
+    state, event, pid = next_event.split(':')
+    assert (state, event) == ('wait', 'go')
+    assert int(pid) != os.getpid()
+    scenario.store_repo.write_store.assert_awaited_with('SCENARIO-ID', BaseScenarioStore(state='gone'))
+
+
+def test_process_handler_must_be_static():
+    with pytest.raises(ScenarioError, match='must be staticmethod'):
+        class MethodScenario(Scenario):
+            @event_handler('go', [('wait', 'gone')], execution=HandlerExecution.Process)
+            def on_go(self, event):
+                pass
+
+    with pytest.raises(ScenarioError, match='must be staticmethod'):
+        ProcessScenario.add_event_handler('stop', [('wait', 'gone')], lambda store, event: None,
+                                          execution=HandlerExecution.Process)
+
+
+@pytest.mark.asyncio
+async def test_independent_transition_handlers(mocker):
+    calls = []
+
+    class ParallelScenario(Scenario):
+        name = 'parallel'
+        end_states = frozenset()
+
+        @event_handler(Event.Signal, [(FakeState.WaitSignal, FakeState.WaitFlag)])
+        def on_signal(self, _):
+            return HandlerResult(state=FakeState.WaitFlag.value)
+
+        @on_enter(FakeState.WaitFlag, independent=True)
+        async def enter1(self):
+            calls.append('enter1')
+            await asyncio.sleep(0)
+            calls.append('enter1 done')
+            raise ValueError('enter1')
+
+        @on_enter(FakeState.WaitFlag, independent=True)
+        async def enter2(self):
+            calls.append('enter2')
+            raise ValueError('enter2')
+
+    scenario = ParallelScenario(mocker.AsyncMock(spec=TaskScheduler), mocker.AsyncMock(spec=ScenarioStoreRepo))
+    scenario.store_repo.read_store.return_value = BaseScenarioStore(state='wait-signal')
+
+    with pytest.raises(ScenarioHandlersError) as error:
+        await scenario.run(cast(ScenarioId, 'SCENARIO-ID'), Event.Signal.value)
+
+    assert calls == ['enter1', 'enter2', 'enter1 done']
+    assert [str(it) for it in error.value.errors] == ['enter1', 'enter2']
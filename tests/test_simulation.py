@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import cast
+
+import pytest
+
+from ltsched.model import BaseScenarioStore, ScenarioId
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+from ltsched.simulation import Simulation, VirtualClock, VirtualTimeScheduler
+
+START = datetime(2020, 1, 1)
+
+
+@dataclass
+class TickStore(BaseScenarioStore):
+    ticks: int = 0
+
+
+class TickScenario(Scenario):
+    name = 'tick'
+    start_state = 'wait'
+    end_states = frozenset(('done',))
+
+    @event_handler('tick', [('wait', ('wait', 'done'))])
+    def on_tick(self, _):
+        self.store.ticks += 1
+        if self.store.ticks == 24:
+            return HandlerResult(state='done')
+        return HandlerResult(state='wait', next_event='tick', next_run=timedelta(hours=1))
+
+
+class PlannedTickScenario(TickScenario):
+    name = 'planned-tick'
+    plan_in_store = True
+
+
+@pytest.mark.asyncio
+async def test_scheduler_replace_task():
+    clock = VirtualClock(START)
+    scheduler = VirtualTimeScheduler(clock)
+    await scheduler.schedule(timedelta(hours=1), 'task', 1, task_id='id')
+    await scheduler.schedule(timedelta(hours=2), 'task', 2, task_id='id')
+    await scheduler.schedule(timedelta(hours=3), 'task', 3, task_id='id', force=True)
+
+    assert scheduler.pending == 1
+    assert scheduler.next_due() == START + timedelta(hours=3)
+    clock.now = START + timedelta(hours=3)
+    assert [it[3] for it in scheduler.pop_due()] == [(3,)]
+    assert scheduler.next_due() is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('name', ['tick', 'planned-tick'])
+async def test_simulate_days(name):
+    simulation = Simulation([TickScenario, PlannedTickScenario], start=START)
+    for i in range(10):
+        scenario_id = cast(ScenarioId, f'ID-{i}')
+        await simulation.start(name, scenario_id, TickStore(state='wait'))
+        await simulation.inject(timedelta(minutes=i), name, scenario_id, 'tick')
+
+    report = await simulation.run(until=START + timedelta(days=2))
+
+    assert report.runs == 240
+    assert report.events == {(name, 'tick'): 240}
+    assert not report.errors
+    assert report.states == {(name, 'done'): 10}
+    assert report.peak_pending == 10
+    assert report.duration == timedelta(days=2).total_seconds()
+    # every scenario waits from start till 23rd hour and minutes of start
+    assert report.occupancy[(name, 'wait')] == sum(23 * 3600 + i * 60 for i in range(10))
+    assert report.event_rate == 240 / report.duration
+
+
+@pytest.mark.asyncio
+async def test_simulate_max_runs():
+    simulation = Simulation([TickScenario], start=START)
+    await simulation.start('tick', cast(ScenarioId, 'ID'), TickStore(state='wait'))
+    await simulation.inject(None, 'tick', cast(ScenarioId, 'ID'), 'tick')
+
+    report = await simulation.run(max_runs=5)
+
+    assert report.runs == 5
+    assert report.finished == START + timedelta(hours=4)
+    assert report.states == {('tick', 'wait'): 1}
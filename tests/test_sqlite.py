@@ -0,0 +1,65 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, cast
+
+import pytest
+import pytest_asyncio
+
+from ltsched.model import BaseScenarioStore, ScenarioExecutionStatus, ScenarioId
+from ltsched.sqlite import SqliteScenarioStoreRepo
+
+NOW = datetime(2021, 1, 1)
+
+
+@dataclass
+class FakeStore(BaseScenarioStore):
+    counter: int = 0
+    items: List[str] = field(default_factory=list)
+
+
+@pytest_asyncio.fixture
+async def repo(tmp_path):
+    repo = SqliteScenarioStoreRepo(str(tmp_path / 'store.db'), FakeStore)
+    yield repo
+    await repo.close()
+
+
+@pytest.mark.asyncio
+async def test_read_write_store(repo, mocker):
+    commit = mocker.spy(repo, 'commit')
+    stores = {cast(ScenarioId, f'ID-{i}'): FakeStore(state='state', counter=i, items=['a'], next_run=NOW,
+                                                     next_event='timeout')
+              for i in range(3)}
+
+    await asyncio.gather(*(repo.write_store(k, v) for k, v in stores.items()))
+
+    assert commit.call_count == 1
+    assert await repo.read_store(cast(ScenarioId, 'ID-1')) == stores['ID-1']
+    assert await repo.read_stores(['ID-0', 'ID-2', 'ID-3']) == {'ID-0': stores['ID-0'], 'ID-2': stores['ID-2'],
+                                                                'ID-3': None}
+
+
+@pytest.mark.asyncio
+async def test_search_planned(repo):
+    await repo.write_stores({
+        cast(ScenarioId, 'ID-1'): FakeStore(state='state', next_run=NOW),
+        cast(ScenarioId, 'ID-2'): FakeStore(state='state', next_run=NOW + timedelta(hours=1)),
+        cast(ScenarioId, 'ID-3'): FakeStore(state='state', next_run=NOW, exec_state=ScenarioExecutionStatus.Finished),
+        cast(ScenarioId, 'ID-4'): FakeStore(state='state'),
+    })
+
+    assert await repo.search_planned(NOW + timedelta(minutes=1)) == ['ID-1']
+    assert await repo.next_planned() == NOW
+    assert await repo.next_planned(NOW) == NOW + timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_iter_planned(repo):
+    await repo.write_stores({cast(ScenarioId, f'ID-{i}'): FakeStore(state='state',
+                                                                    next_run=NOW + timedelta(minutes=i % 3))
+                             for i in range(6)})
+
+    pages = [it async for it in repo.iter_planned(NOW + timedelta(minutes=2), batch_size=3)]
+
+    assert pages == [['ID-0', 'ID-3', 'ID-1'], ['ID-4']]
@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from ltsched.wheel import TimingWheelScheduler
+
+NOW = datetime(2021, 1, 1)
+
+
+@pytest.fixture
+def scheduler(mocker):
+    return TimingWheelScheduler(mocker.AsyncMock(), tick=1, wheel_size=4, levels=3, clock=lambda: NOW)
+
+
+@pytest.mark.asyncio
+async def test_fire_in_time(scheduler):
+    delays = list(range(1, 100)) * 2
+    random.Random(0).shuffle(delays)
+    for i, delay in enumerate(delays):
+        await scheduler.schedule(timedelta(seconds=delay), 'task', delay, task_id=str(i))
+
+    for tick in range(1, 100):
+        assert sorted(it.args[0] for it in scheduler.advance()) == [tick, tick]
+    assert scheduler.size == 0
+    assert not scheduler.tasks
+
+
+@pytest.mark.asyncio
+async def test_schedule_datetime_and_overflow(scheduler):
+    await scheduler.schedule(NOW + timedelta(seconds=3), 'task', 'datetime')
+    await scheduler.schedule(timedelta(seconds=130), 'task', 'overflow')
+    await scheduler.schedule(None, 'task', 'now')
+
+    assert [it.args for it in scheduler.advance()] == [('now',)]
+    assert [it.args for it in scheduler.advance(2)] == [('datetime',)]
+    assert scheduler.advance(126) == []
+    assert [it.args for it in scheduler.advance()] == [('overflow',)]
+
+
+@pytest.mark.asyncio
+async def test_replace_task(scheduler):
+    await scheduler.schedule(timedelta(seconds=5), 'task', 'first', task_id='id')
+    await scheduler.schedule(timedelta(seconds=10), 'task', 'ignored', task_id='id')
+    await scheduler.schedule(timedelta(seconds=20), 'task', 'second', task_id='id', force=True)
+
+    assert scheduler.size == 1
+    assert scheduler.advance(19) == []
+    expired = scheduler.advance()
+    assert [it.args for it in expired] == [('second',)]
+
+    await scheduler.fire(expired)
+
+    scheduler.handler.assert_awaited_once_with('task', 'second')
+    assert not scheduler.cancel('id')
@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import queue
+from collections import Counter
+from functools import partial
+from types import SimpleNamespace
+from typing import List, cast
+
+import pytest
+
+from ltsched.model import BaseScenarioStore, ScenarioId
+from ltsched.protocols import TimePoint
+from ltsched.scenario import HandlerResult, Scenario, event_handler
+from ltsched.sqlite import SqliteScenarioStoreRepo
+from ltsched.workers import RUN_EVENT, ShardedWorkerPool, serve, shard_of
+
+
+class CounterScenario(Scenario):
+    name = 'sharded-counter'
+    start_state = 'count'
+    end_states = frozenset()
+
+    @event_handler('inc', [('count', 'count')])
+    def on_inc(self, _):
+        self.store.error = str(int(self.store.error or 0) + 1)
+        return HandlerResult(state='count')
+
+
+class NullScheduler:
+
+    async def schedule(self, point: TimePoint, task_name: str, *args, task_id=None, force=False) -> None:
+        pass
+
+
+def make_scenarios(path: str) -> List[Scenario]:
+    return [CounterScenario(NullScheduler(), SqliteScenarioStoreRepo(path))]
+
+
+def test_shard_of():
+    shards = Counter(shard_of(cast(ScenarioId, f'ID-{i}'), 4) for i in range(4000))
+
+    assert sorted(shards) == [0, 1, 2, 3]
+    assert min(shards.values()) > 800
+    assert sum(shard_of(cast(ScenarioId, f'ID-{i}'), 4) != shard_of(cast(ScenarioId, f'ID-{i}'), 5)
+               for i in range(4000)) < 1000
+
+
+def test_worker_pool(tmp_path):
+    path = str(tmp_path / 'store.db')
+    ids = [cast(ScenarioId, f'ID-{i}') for i in range(8)]
+
+    async def prepare():
+        repo = SqliteScenarioStoreRepo(path)
+        await repo.write_stores({it: BaseScenarioStore(state='count') for it in ids})
+        await repo.close()
+
+    async def read():
+        repo = SqliteScenarioStoreRepo(path)
+        stores = await repo.read_stores(ids)
+        await repo.close()
+        return stores
+
+    asyncio.run(prepare())
+    pool = ShardedWorkerPool(partial(make_scenarios, path), workers=2, context=multiprocessing.get_context('fork'))
+    pool.start()
+    for _ in range(5):
+        for scenario_id in ids:
+            pool.dispatch('sharded-counter', scenario_id, 'inc')
+    pool.stop(timeout=10)
+
+    assert {k: v.error for k, v in asyncio.run(read()).items()} == {it: '5' for it in ids}
+
+
+@pytest.mark.asyncio
+async def test_serve_concurrency(mocker):
+    running, peak = 0, 0
+
+    async def dispatch(scenario_id, event):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    mocker.patch('ltsched.workers.MailboxDispatcher', return_value=SimpleNamespace(dispatch=dispatch))
+    messages: queue.Queue = queue.Queue()
+    for i in range(10):
+        messages.put((RUN_EVENT, 'counter', cast(ScenarioId, f'ID-{i}'), 'inc'))
+    messages.put(None)
+
+    await serve(lambda: [SimpleNamespace(name='counter', store_repo=None)], messages, concurrency=3)
+
+    assert peak == 3 and running == 0 and messages.empty()
+
+
+@pytest.mark.asyncio
+async def test_dispatch_full_queue():
+    pool = ShardedWorkerPool(make_scenarios, workers=1)
+    pool.queues.append(queue.Queue(1))
+    pool.dispatch('sharded-counter', cast(ScenarioId, 'ID-1'), 'inc', block=False)
+
+    with pytest.raises(queue.Full):
+        pool.dispatch('sharded-counter', cast(ScenarioId, 'ID-2'), 'inc', block=False)
+
+    task = asyncio.ensure_future(pool.dispatch_async('sharded-counter', cast(ScenarioId, 'ID-2'), 'inc'))
+    await asyncio.sleep(0.01)
+    assert not task.done()
+    assert pool.queues[0].get_nowait()[2] == 'ID-1'
+    await asyncio.wait_for(task, 1)
+    assert pool.queues[0].get_nowait()[2] == 'ID-2'